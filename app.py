@@ -1,8 +1,8 @@
 import streamlit as st
-from datetime import datetime
-from PIL import Image
 import os
 
+from utils.ingest import ingest_upload
+from utils.previews import upload_digest, preview_jpeg
 from utils.exif_checker import extract_exif_data, get_datetime_original
 from utils.ocr_extractor import extract_text_from_image
 from utils.summarizer import summarize_text
@@ -32,15 +32,12 @@ if st.button("🚀 Submit Claim"):
             st.divider()
             st.subheader(f"🖼️ Processing: {uploaded_file.name}")
 
-            image = Image.open(uploaded_file)
-            st.image(image, caption="Uploaded File", use_container_width=True)
+            upload_bytes = uploaded_file.getvalue()
+            st.image(preview_jpeg(upload_digest(upload_bytes), upload_bytes), caption="Uploaded File", use_container_width=True)
 
-            # Save uploaded file properly
-            os.makedirs("data/uploaded_images", exist_ok=True)
-            file_id = datetime.now().strftime("%Y%m%d%H%M%S%f")
-            img_path = f"data/uploaded_images/{file_id}_{uploaded_file.name}"
-            with open(img_path, "wb") as f:
-                f.write(uploaded_file.getbuffer())
+            # Stream into the content-addressed store; repeat uploads share one copy
+            upload = ingest_upload(uploaded_file, uploaded_file.name)
+            file_id, img_path = upload["asset_id"], upload["path"]
 
             # EXIF metadata extraction and validation
             with st.spinner("🔍 Extracting EXIF metadata..."):
@@ -1,10 +1,9 @@
 import streamlit as st
-from datetime import datetime
 from PIL import Image
-import os
 
-from claim_agent import claim_agent
+from claim_agent import process_claims
 from utils.generate_pdf import generate_claim_pdf
+from utils.ingest import ingest_upload
 
 st.set_page_config(page_title="🏚️ Insurance Claim Agent", layout="centered")
 st.title("🏚️ House Insurance Claim - AI Workflow")
@@ -31,30 +30,30 @@ if st.button("🚀 Submit Claim"):
     if not uploaded_files or not user_claim_text.strip():
         st.warning("⚠️ Please upload at least one image and provide a claim description.")
     else:
-        os.makedirs("data/uploaded_images", exist_ok=True)
-
-        for uploaded_file in uploaded_files:
-            st.divider()
-            st.subheader(f"🖼️ Processing: {uploaded_file.name}")
-
-            file_id = datetime.now().strftime("%Y%m%d%H%M%S%f")
-            file_path = f"data/uploaded_images/{file_id}_{uploaded_file.name}"
-            with open(file_path, "wb") as f:
-                f.write(uploaded_file.getbuffer())
-
-            state = {
-                "file_path": file_path,
-                "user_text": user_claim_text,
-                "policy_data": {
-                    "policy_date": policy_date.isoformat(),
-                    "dol": dol.isoformat(),
-                    "threshold": threshold
-                }
+        # All uploads are assets of one claim: one extraction, one verdict
+        uploads = [ingest_upload(f, f.name) for f in uploaded_files]
+        file_id = uploads[0]["upload_id"]
+
+        state = {
+            "claim_id": file_id,
+            "assets": [{"file_path": u["path"], "name": u["name"]} for u in uploads],
+            "user_text": user_claim_text,
+            "policy_data": {
+                "policy_date": policy_date.isoformat(),
+                "dol": dol.isoformat(),
+                "threshold": threshold
             }
+        }
 
-            with st.spinner("🤖 Running AI agent..."):
-                result = claim_agent.invoke(state)
+        with st.spinner(f"🤖 Running AI agent on {len(uploads)} file(s)..."):
+            result = process_claims([state])[0]
 
+        st.divider()
+        st.subheader(f"🖼️ Processing: {', '.join(u['name'] for u in uploads)}")
+
+        if isinstance(result, Exception):
+            st.error(f"⚠️ Could not process this claim: {result}")
+        else:
             # ✅ FINAL DECISION DISPLAY (with formatting)
             st.subheader("📋 Final Decision")
 
@@ -90,7 +89,7 @@ if st.button("🚀 Submit Claim"):
             st.write(result.get("misrep", "No output"))
 
             st.markdown("### 🖼️ Vision Labels:")
-            st.write(result.get("labels", "No vision labels found."))
+            st.write(result.get("image_labels", "No vision labels found."))
 
             # 📥 Generate downloadable PDF
             pdf_path = f"data/claim_report_{file_id}.pdf"
@@ -98,7 +97,7 @@ if st.button("🚀 Submit Claim"):
                 output_path=pdf_path,
                 summary=result.get("summary", ""),
                 decision=result.get("final_decision", ""),
-                labels=result.get("labels", ""),
+                labels=result.get("image_labels", ""),
                 key_info=result.get("key_info", ""),
                 misrep=result.get("misrep", "")
             )
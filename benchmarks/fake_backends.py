@@ -0,0 +1,279 @@
+"""Local stand-ins for Vision, Gemini, OpenAI and Tesseract.
+
+Each backend sleeps for a configurable latency (uniform jitter around the
+mean) and fails with a configurable probability, so the pipeline can be
+measured offline. The fakes are installed through the same seams the real
+clients use: `utils.clients.register` for API clients and the names
+`claim_agent` imports for OCR. Outputs are derived from a hash of the input,
+so the same image or prompt always gets the same answer.
+"""
+import asyncio
+import hashlib
+import importlib
+import random
+import threading
+import time
+from types import SimpleNamespace
+
+DEFAULT_LATENCY = {"vision": 0.35, "gemini": 0.9, "openai": 0.7, "ocr": 0.5}
+DEFAULT_FAILURE_RATE = {"vision": 0.0, "gemini": 0.0, "openai": 0.0, "ocr": 0.0}
+FIRST_LINE_SHARE = 0.2
+
+LABELS = [
+    "Laptop", "Electronics", "Fire", "Smoke", "Room", "Furniture", "Water",
+    "Ceiling", "Floor", "Wall", "Kitchen", "Vehicle", "Roof", "Window", "Debris",
+]
+
+
+class BackendError(RuntimeError):
+    status_code = 503  # looks like provider throttling, so utils/resilience.py retries it
+
+
+class Backend:
+    def __init__(self, name, latency, failure_rate, jitter=0.3, seed=0):
+        self.name = name
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.jitter = jitter
+        self.calls = 0
+        self._rng = random.Random(f"{seed}:{name}")
+        self._lock = threading.Lock()
+
+    def _draw(self):
+        with self._lock:
+            self.calls += 1
+            delay = self.latency * self._rng.uniform(1 - self.jitter, 1 + self.jitter)
+            failed = self._rng.random() < self.failure_rate
+        return max(delay, 0.0), failed
+
+    def wait(self):
+        delay, failed = self._draw()
+        time.sleep(delay)
+        if failed:
+            raise BackendError(f"simulated {self.name} failure")
+
+    async def await_(self):
+        delay, failed = self._draw()
+        await asyncio.sleep(delay)
+        if failed:
+            raise BackendError(f"simulated {self.name} failure")
+
+
+def _pick(data, choices, n):
+    digest = hashlib.sha256(data if isinstance(data, bytes) else data.encode()).digest()
+    return [choices[b % len(choices)] for b in digest[:n]]
+
+def _usage(prompt, text):
+    return len(prompt) // 4, len(text) // 4
+
+
+# Vision
+def _annotate(requests):
+    from google.cloud import vision
+
+    responses = []
+    for request in requests:
+        labels = dict.fromkeys(_pick(request.image.content, LABELS, 5))
+        responses.append(vision.AnnotateImageResponse(
+            label_annotations=[vision.EntityAnnotation(description=l, score=0.9) for l in labels]
+        ))
+    return vision.BatchAnnotateImagesResponse(responses=responses)
+
+class FakeVisionClient:
+    def __init__(self, backend):
+        self.backend = backend
+
+    def batch_annotate_images(self, requests):
+        self.backend.wait()
+        return _annotate(requests)
+
+class FakeVisionAsyncClient(FakeVisionClient):
+    async def batch_annotate_images(self, requests):
+        await self.backend.await_()
+        return _annotate(requests)
+
+
+# Gemini summarizer (google.generativeai.GenerativeModel)
+class FakeGeminiModel:
+    def __init__(self, backend):
+        self.backend = backend
+
+    def _response(self, prompt):
+        label = _pick(prompt, LABELS, 1)[0]
+        text = (
+            f"- 📝 Summary: The user reports damage involving {label.lower()}.\n"
+            f"- 🔍 Visual Label Relevance: Labels partially support the claim."
+        )
+        prompt_tokens, completion_tokens = _usage(prompt, text)
+        return SimpleNamespace(text=text, usage_metadata=SimpleNamespace(
+            prompt_token_count=prompt_tokens, candidates_token_count=completion_tokens,
+        ))
+
+    def generate_content(self, prompt):
+        self.backend.wait()
+        return self._response(prompt)
+
+    async def generate_content_async(self, prompt):
+        await self.backend.await_()
+        return self._response(prompt)
+
+
+# Key-info LLMChain (OpenAI)
+class FakeKeyInfoChain:
+    def __init__(self, backend):
+        self.backend = backend
+
+    def _text(self, text):
+        item = _pick(text, LABELS, 1)[0]
+        return (
+            "- Incident Date: 2025-05-15\n"
+            f"- Damaged Items/Property: {item}\n"
+            "- Claimed Amounts: Not stated\n"
+            "- Cause of Damage: Fire\n"
+            "- Supporting Documents: Photo"
+        )
+
+    def run(self, text):
+        self.backend.wait()
+        return self._text(text)
+
+    async def arun(self, text):
+        await self.backend.await_()
+        return self._text(text)
+
+
+# Structured claim extractor (ChatGoogleGenerativeAI.with_structured_output)
+class FakeClaimExtractor:
+    def __init__(self, backend):
+        self.backend = backend
+
+    def _result(self, prompt):
+        item = _pick(prompt, LABELS, 1)[0]
+        parsed = {
+            "summary": f"The user reports fire damage to a {item.lower()}.",
+            "label_relevance": "Labels partially support the claim.",
+            "labels_support_claim": True,
+            "incident_date": "2025-05-15",
+            "damaged_items": [item],
+            "claimed_amounts": [{"amount": 1200.0, "currency": "USD", "description": "Replacement"}],
+            "cause_of_damage": "Fire",
+            "supporting_documents": ["Photo"],
+        }
+        prompt_tokens, completion_tokens = _usage(prompt, str(parsed))
+        raw = SimpleNamespace(
+            content="",
+            usage_metadata={"input_tokens": prompt_tokens, "output_tokens": completion_tokens},
+        )
+        return {"raw": raw, "parsed": parsed, "parsing_error": None}
+
+    def invoke(self, prompt, **kwargs):
+        self.backend.wait()
+        return self._result(prompt)
+
+    async def ainvoke(self, prompt, **kwargs):
+        await self.backend.await_()
+        return self._result(prompt)
+
+
+# Decision chat model (ChatGoogleGenerativeAI)
+class FakeChatModel:
+    def __init__(self, backend):
+        self.backend = backend
+
+    def _message(self, prompt):
+        verdict = _pick(prompt, ["APPROVE", "FLAG", "FLAG", "REJECT"], 1)[0]
+        text = f"{verdict}: benchmark stand-in decision\n- Evidence reviewed by fake backend."
+        prompt_tokens, completion_tokens = _usage(prompt, text)
+        return SimpleNamespace(
+            content=text,
+            usage_metadata={"input_tokens": prompt_tokens, "output_tokens": completion_tokens},
+        )
+
+    def invoke(self, prompt, **kwargs):
+        self.backend.wait()
+        return self._message(prompt)
+
+    async def ainvoke(self, prompt, **kwargs):
+        await self.backend.await_()
+        return self._message(prompt)
+
+    # Streaming sends the verdict line after FIRST_LINE_SHARE of the latency
+    # and the explanation at the end
+    def stream(self, prompt, **kwargs):
+        delay, failed = self.backend._draw()
+        time.sleep(delay * FIRST_LINE_SHARE)
+        if failed:
+            raise BackendError("simulated gemini failure")
+        first, second = self._chunks(prompt)
+        yield first
+        time.sleep(delay * (1 - FIRST_LINE_SHARE))
+        yield second
+
+    async def astream(self, prompt, **kwargs):
+        delay, failed = self.backend._draw()
+        await asyncio.sleep(delay * FIRST_LINE_SHARE)
+        if failed:
+            raise BackendError("simulated gemini failure")
+        first, second = self._chunks(prompt)
+        yield first
+        await asyncio.sleep(delay * (1 - FIRST_LINE_SHARE))
+        yield second
+
+    def _chunks(self, prompt):
+        from langchain_core.messages import AIMessageChunk
+
+        message = self._message(prompt)
+        verdict, rest = message.content.split("\n", 1)
+        usage = message.usage_metadata
+        return (
+            AIMessageChunk(content=verdict + "\n"),
+            AIMessageChunk(content=rest, usage_metadata={
+                **usage, "total_tokens": usage["input_tokens"] + usage["output_tokens"],
+            }),
+        )
+
+
+def install(latency=None, failure_rate=None, jitter=0.3, seed=0, fake_ocr=True):
+    """Swap every external backend for a fake; returns {name: Backend}."""
+    # Import the real modules first so their own register() calls run before ours
+    import claim_agent
+    from utils.clients import register
+
+    for module in ("utils.summarizer", "utils.key_info_extractor", "utils.claim_extractor", "utils.vision_labels"):
+        importlib.import_module(module)
+
+    latency = {**DEFAULT_LATENCY, **(latency or {})}
+    failure_rate = {**DEFAULT_FAILURE_RATE, **(failure_rate or {})}
+    backends = {
+        name: Backend(name, latency[name], failure_rate[name], jitter, seed)
+        for name in DEFAULT_LATENCY
+    }
+
+    register("vision", lambda: FakeVisionClient(backends["vision"]))
+    register("vision_async", lambda: FakeVisionAsyncClient(backends["vision"]), per_loop=True)
+    register("gemini_summarizer", lambda: FakeGeminiModel(backends["gemini"]))
+    register("key_info_chain", lambda: FakeKeyInfoChain(backends["openai"]))
+    register("claim_extractor", lambda: FakeClaimExtractor(backends["gemini"]))
+    register("decision_llm", lambda: FakeChatModel(backends["gemini"]))
+
+    if fake_ocr:
+        ocr = backends["ocr"]
+
+        # Like the real extractor, an OCR failure yields empty text, not an error
+        def extract_text_from_image(image_path, mode="fast"):
+            try:
+                ocr.wait()
+            except BackendError:
+                return ""
+            return "Invoice\nTotal: $1,200.00"
+
+        async def aextract_text_from_image(image_path, mode="fast"):
+            try:
+                await ocr.await_()
+            except BackendError:
+                return ""
+            return "Invoice\nTotal: $1,200.00"
+
+        claim_agent.extract_text_from_image = extract_text_from_image
+        claim_agent.aextract_text_from_image = aextract_text_from_image
+    return backends
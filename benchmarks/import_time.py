@@ -0,0 +1,73 @@
+"""Cold-import benchmark for the claim pipeline.
+
+Every sample runs in a fresh interpreter so nothing is already cached in
+sys.modules, which is what a Streamlit cold start or a new worker sees.
+
+    python benchmarks/import_time.py --runs 5
+    python benchmarks/import_time.py --top 15   # slowest modules per target
+"""
+import os
+import sys
+import argparse
+import statistics
+import subprocess
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+TARGETS = {
+    "utils.summarizer": "import utils.summarizer",
+    "claim_agent": "import claim_agent",
+    "claim_agent + graph": "from claim_agent import claim_agent",
+}
+
+TIMER = (
+    "import time; _t = time.perf_counter(); {stmt}; "
+    "print(f'__elapsed__ {{time.perf_counter() - _t}}')"
+)
+
+
+def run_once(stmt, importtime=False):
+    cmd = [sys.executable]
+    if importtime:
+        cmd += ["-X", "importtime"]
+    cmd += ["-c", TIMER.format(stmt=stmt)]
+    proc = subprocess.run(cmd, cwd=REPO_ROOT, capture_output=True, text=True)
+    for line in proc.stdout.splitlines():
+        if line.startswith("__elapsed__"):
+            return float(line.split()[1]), proc.stderr
+    raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr else "no output")
+
+
+def slowest_modules(stderr, top):
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|")
+        rows.append((int(self_us), name.strip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=0, help="show the N slowest modules")
+    args = parser.parse_args()
+
+    print(f"{'target':<24}{'median ms':>12}{'min ms':>10}")
+    for name, stmt in TARGETS.items():
+        try:
+            samples = [run_once(stmt)[0] * 1000 for _ in range(args.runs)]
+        except RuntimeError as e:
+            print(f"{name:<24}{'failed':>12}  {e}")
+            continue
+        print(f"{name:<24}{statistics.median(samples):>12.1f}{min(samples):>10.1f}")
+
+        if args.top:
+            _, stderr = run_once(stmt, importtime=True)
+            for self_us, module in slowest_modules(stderr, args.top):
+                print(f"    {self_us / 1000:>8.1f} ms  {module}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,274 @@
+"""End-to-end claim pipeline benchmark against local fake backends.
+
+Runs claim_agent over the images in data/uploaded_images with Vision, Gemini,
+OpenAI and (by default) Tesseract replaced by the stand-ins in
+fake_backends.py. Each concurrency level runs in a fresh interpreter with its
+own empty caches and indexes, so levels do not warm each other up and peak
+RSS is per level.
+
+    python benchmarks/pipeline.py --concurrency 1,4,16
+    python benchmarks/pipeline.py --async --concurrency 16,64 --claims 256
+    python benchmarks/pipeline.py --latency gemini=1.5 --failure-rate vision=0.05
+    python benchmarks/pipeline.py --images-per-claim 6   # multi-image claims
+    python benchmarks/pipeline.py --json out.json
+    python benchmarks/pipeline.py --check out.json   # exit 1 on regression
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_IMAGES = os.path.join(REPO_ROOT, "data", "uploaded_images")
+USER_TEXT = "My laptop was damaged during a fire in my house. It was completely burnt, and I have attached a photo of the remains."
+
+# --check fails when throughput drops or a node's p95 grows by more than
+# TOLERANCE; p95 changes under NOISE_MS are scheduler jitter, not regressions
+TOLERANCE = 0.2
+NOISE_MS = 25
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered) + 0.5) - 1))
+    return ordered[rank]
+
+
+def parse_pairs(text):
+    """"gemini=1.5,vision=0.2" -> {"gemini": 1.5, "vision": 0.2}"""
+    pairs = {}
+    for item in filter(None, (text or "").split(",")):
+        name, value = item.split("=")
+        pairs[name.strip()] = float(value)
+    return pairs
+
+
+# Worker: one concurrency level in this process
+def run_level(args):
+    scratch = tempfile.mkdtemp(prefix="claim-bench-")
+    # Must be set before any utils module reads them at import
+    os.environ["CLAIM_CACHE_DIR"] = os.path.join(scratch, "cache")
+    os.environ["CLAIM_INDEX_DIR"] = os.path.join(scratch, "claim_index")
+    os.environ["CLAIM_HASH_DB"] = os.path.join(scratch, "image_hashes.sqlite")
+    os.environ["CLAIM_TRACE_DIR"] = os.path.join(scratch, "traces")
+    os.environ["CLAIM_ASSET_DIR"] = os.path.join(scratch, "assets")
+    os.environ["CLAIM_CHECKPOINT_DB"] = os.path.join(scratch, "checkpoints.sqlite")
+    if args.unthrottled:
+        for backend in ("VISION", "GEMINI", "OPENAI"):
+            os.environ[f"CLAIM_{backend}_RATE"] = "1e9"
+            os.environ[f"CLAIM_{backend}_BURST"] = "1000000"
+    sys.path.insert(0, REPO_ROOT)
+
+    try:
+        import resource
+        import fake_backends
+        from claim_agent import get_claim_agent, process_claims, aprocess_claims
+
+        backends = fake_backends.install(
+            latency=parse_pairs(args.latency),
+            failure_rate=parse_pairs(args.failure_rate),
+            jitter=args.jitter,
+            seed=args.seed,
+            fake_ocr=args.ocr == "fake",
+        )
+        if not args.keep_duplicates:
+            _ignore_duplicate_matches()
+
+        states = build_states(args)
+        get_claim_agent()  # compile outside the timed region
+
+        start = time.perf_counter()
+        if args.use_async:
+            import asyncio
+            results = asyncio.run(aprocess_claims(states, max_concurrency=args.level))
+        else:
+            results = process_claims(states, max_workers=args.level)
+        wall = time.perf_counter() - start
+
+        nodes, failed, by_rules = {}, 0, 0
+        for result in results:
+            if isinstance(result, Exception):
+                failed += 1
+                continue
+            by_rules += bool(result.get("rule_hits"))
+            for span in result.get("trace", []):
+                nodes.setdefault(span["node"], []).append(span["ms"])
+
+        peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        if sys.platform == "darwin":
+            peak_kb //= 1024  # bytes on macOS
+        return {
+            "concurrency": args.level,
+            "mode": "async" if args.use_async else "threads",
+            "claims": len(states),
+            "failed": failed,
+            "decided_by_rules": by_rules,
+            "wall_s": round(wall, 3),
+            "claims_per_s": round(len(states) / wall, 2) if wall else 0.0,
+            "peak_rss_mb": round(peak_kb / 1024, 1),
+            "backend_calls": {name: b.calls for name, b in backends.items()},
+            "nodes": {
+                name: {
+                    "n": len(ms),
+                    "p50": percentile(ms, 50),
+                    "p95": percentile(ms, 95),
+                    "p99": percentile(ms, 99),
+                }
+                for name, ms in nodes.items()
+            },
+        }
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+def build_states(args):
+    names = sorted(
+        n for n in os.listdir(args.images)
+        if n.lower().endswith((".jpg", ".jpeg", ".png"))
+    )
+    if not names:
+        raise SystemExit(f"no images in {args.images}")
+    count = args.claims or len(names) // args.images_per_claim or 1
+    states = []
+    for i in range(count):
+        paths = [
+            os.path.join(args.images, names[(i * args.images_per_claim + j) % len(names)])
+            for j in range(args.images_per_claim)
+        ]
+        state = {
+            "claim_id": f"bench-{i}",
+            "file_path": paths[0],
+            "user_text": USER_TEXT,
+            "policy_data": {"policy_date": "2000-01-01", "dol": "2025-05-15", "threshold": 2},
+            "use_llm_cache": args.llm_cache,
+        }
+        if len(paths) > 1:
+            state["assets"] = [{"file_path": path} for path in paths]
+        states.append(state)
+    return states
+
+def _ignore_duplicate_matches():
+    # The sample set repeats images, and --claims beyond the image count reuses
+    # them; still pay for hashing but don't let repeats short-circuit the graph
+    import utils.image_hash as image_hash
+
+    real = image_hash.check_and_register
+
+    def check_and_register(image_path, claim_id):
+        real(image_path, claim_id)
+        return []
+
+    image_hash.check_and_register = check_and_register
+    image_hash.BatchDuplicates.matches = lambda self, image_path, claim_id: []
+
+
+# Driver
+def spawn_level(level, argv):
+    cmd = [sys.executable, os.path.abspath(__file__), "--worker", "--level", str(level)] + argv
+    proc = subprocess.run(cmd, cwd=REPO_ROOT, capture_output=True, text=True)
+    for line in reversed(proc.stdout.splitlines()):
+        if line.startswith("{"):
+            return json.loads(line)
+    raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr else "no output")
+
+def print_report(reports):
+    print(f"{'conc':>5}{'mode':>9}{'claims':>8}{'failed':>8}{'rules':>7}"
+          f"{'wall s':>9}{'claims/s':>10}{'peak MB':>9}")
+    for r in reports:
+        print(f"{r['concurrency']:>5}{r['mode']:>9}{r['claims']:>8}{r['failed']:>8}"
+              f"{r['decided_by_rules']:>7}{r['wall_s']:>9.2f}{r['claims_per_s']:>10.2f}"
+              f"{r['peak_rss_mb']:>9.1f}")
+    for r in reports:
+        print(f"\nper-node ms at concurrency {r['concurrency']} ({r['mode']})")
+        print(f"  {'node':<17}{'n':>6}{'p50':>10}{'p95':>10}{'p99':>10}")
+        for name, s in r["nodes"].items():
+            print(f"  {name:<17}{s['n']:>6}{s['p50']:>10.1f}{s['p95']:>10.1f}{s['p99']:>10.1f}")
+
+def check_regressions(reports, baseline_path):
+    with open(baseline_path) as f:
+        baseline = {(r["concurrency"], r["mode"]): r for r in json.load(f)}
+    problems = []
+    for r in reports:
+        base = baseline.get((r["concurrency"], r["mode"]))
+        if not base:
+            continue
+        if r["claims_per_s"] < base["claims_per_s"] * (1 - TOLERANCE):
+            problems.append(
+                f"concurrency {r['concurrency']}: {r['claims_per_s']} claims/s "
+                f"vs baseline {base['claims_per_s']}"
+            )
+        for name, s in r["nodes"].items():
+            before = base["nodes"].get(name)
+            if before and s["p95"] > max(before["p95"] * (1 + TOLERANCE), before["p95"] + NOISE_MS):
+                problems.append(
+                    f"concurrency {r['concurrency']}: {name} p95 {s['p95']:.1f} ms "
+                    f"vs baseline {before['p95']:.1f} ms"
+                )
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", default="1,4,16", help="comma-separated levels")
+    parser.add_argument("--claims", type=int, default=0, help="claims per level (default: one per image)")
+    parser.add_argument("--images-per-claim", type=int, default=1)
+    parser.add_argument("--images", default=DEFAULT_IMAGES)
+    parser.add_argument("--async", dest="use_async", action="store_true", help="use aprocess_claims")
+    parser.add_argument("--latency", default="", help="mean seconds, e.g. vision=0.3,gemini=0.9")
+    parser.add_argument("--failure-rate", default="", help="e.g. vision=0.02,openai=0.01")
+    parser.add_argument("--jitter", type=float, default=0.3, help="latency spread as a fraction of the mean")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--ocr", choices=["fake", "real"], default="fake", help="real runs Tesseract")
+    parser.add_argument("--unthrottled", action="store_true",
+                        help="disable the client-side rate limiters in utils/resilience.py")
+    parser.add_argument("--llm-cache", action="store_true", help="allow LLM cache hits between claims")
+    parser.add_argument("--keep-duplicates", action="store_true",
+                        help="let repeated images be flagged as duplicates")
+    parser.add_argument("--json", help="write the reports to this file")
+    parser.add_argument("--check", help="compare against a --json baseline; exit 1 on regression")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--level", type=int, default=1, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_level(args)))
+        return
+
+    # Everything except --concurrency/--json/--check is passed through to workers
+    passthrough = []
+    skip = False
+    for arg in sys.argv[1:]:
+        if skip:
+            skip = False
+            continue
+        name = arg.split("=")[0]
+        if name in ("--concurrency", "--json", "--check"):
+            skip = "=" not in arg
+            continue
+        passthrough.append(arg)
+
+    reports = []
+    for level in [int(c) for c in args.concurrency.split(",") if c]:
+        try:
+            reports.append(spawn_level(level, passthrough))
+        except RuntimeError as e:
+            print(f"concurrency {level}: failed  {e}")
+    print_report(reports)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(reports, f, indent=2)
+    if args.check:
+        problems = check_regressions(reports, args.check)
+        for problem in problems:
+            print("REGRESSION:", problem)
+        sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,31 +1,97 @@
 import os
-from typing import TypedDict, Optional
+import asyncio
+import logging
+import operator
+import itertools
+import uuid
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import TypedDict, Optional, Annotated
 from datetime import datetime
-from langgraph.graph import StateGraph, END
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain.prompts import PromptTemplate
 from dotenv import load_dotenv
 
-from utils.exif_checker import extract_exif_data, get_datetime_original
-from utils.vision_labels import get_image_labels
-from utils.summarizer import summarize_text
-from utils.key_info_extractor import extract_key_info
+from utils.exif_checker import extract_exif_data, get_datetime_original, get_gps_coordinates
+from utils.vision_labels import annotate_images, aannotate_images
+from utils.ocr_extractor import extract_text_from_image, aextract_text_from_image
+from utils.claim_extractor import extract_claim, aextract_claim, format_summary, format_key_info, SchemaMismatch
 from utils.misrep_detector import detect_misrepresentation
-from utils.similar_claims import retrieve_similar_claims
+from utils.rules import evaluate_rules
+from utils.image_prep import prepare_image
+from utils.llm_cache import cached_completion, acached_completion
+from utils.clients import register, get_client
+from utils.tracing import traced, record_usage, export_trace
+from utils.node_cache import reuse_outputs
+from utils.resilience import BackendUnavailable, resilient_call, aresilient_call
+from utils.checkpoints import (
+    make_saver, thread_config, thread_ids, is_finished, is_stuck, describe,
+    prune_finished,
+)
 
 load_dotenv()
 
+log = logging.getLogger(__name__)
+
+# LangChain, LangGraph and the Google SDKs take seconds to import, so they are
+# only imported when a model is built or the graph is compiled. Importing this
+# module is cheap and has no side effects beyond reading .env.
+
 # llm = ChatOpenAI(model="gpt-4", api_key=os.getenv("OPENAI_API_KEY"))
-llm = ChatGoogleGenerativeAI(model="gemini-1.5-flash")
+DECISION_MODEL = "gemini-1.5-flash"
+DECISION_PARAMS = {"temperature": 0}
 
+def _make_decision_llm():
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    # Retries and timeouts are handled by utils/resilience.py
+    return ChatGoogleGenerativeAI(model=DECISION_MODEL, max_retries=0, **DECISION_PARAMS)
 
+register("decision_llm", _make_decision_llm)
 
-class ClaimState(TypedDict, total=False):
+# Per-image stages of a multi-image claim run their images on this pool
+register("asset_pool", lambda: ThreadPoolExecutor(
+    max_workers=int(os.getenv("CLAIM_ASSET_THREADS", 8)), thread_name_prefix="claim-asset",
+))
+
+
+
+class ClaimAsset(TypedDict, total=False):
     file_path: str
+    name: str
+    vision_path: str  # downscaled, upright JPEG for Vision (utils/image_prep.py)
+    ocr_path: str  # upright grayscale variant for OCR
     exif: dict
     exif_date: Optional[str]
+    gps_available: bool
+    gps_coordinates: Optional[tuple]
+    exif_vs_policy: str
+    exif_vs_dol: str
+    duplicate_of: list
     image_labels: Optional[str]
+    image_relevance: bool
+    label_error: Optional[str]  # Vision's error for this image, if it had one
+    ocr_text: Optional[str]
+
+
+def merge_assets(left, right):
+    """Reducer for ClaimState.assets: each update is merged into the asset at the same index."""
+    if not left:
+        return list(right or [])
+    if not right:
+        return left
+    merged = [{**old, **new} for old, new in zip(left, right)]
+    return merged + left[len(right):] + right[len(left):]
+
+
+class ClaimState(TypedDict, total=False):
+    claim_id: str
+    file_path: str  # the first asset's file; single-image callers set only this
+    assets: Annotated[list, merge_assets]  # one ClaimAsset per uploaded image or document
+    exif: dict
+    exif_date: Optional[str]
+    image_labels: Optional[str]
+    ocr_text: Optional[str]
     user_text: Optional[str]
+    extraction: dict  # structured fields from utils/claim_extractor.py
     summary: Optional[str]
     key_info: Optional[str]
     misrep: Optional[str]
@@ -33,22 +99,163 @@ class ClaimState(TypedDict, total=False):
     final_decision: Optional[str]
     policy_data: dict
     gps_available: bool
+    gps_coordinates: Optional[tuple]
     image_relevance: bool
     exif_vs_policy: str
     exif_vs_dol: str
     misrep_found: bool
+    duplicate_of: list  # earlier submissions whose image matches this one
+    rule_hits: list  # hard rules that fired; non-empty means decided without LLMs
+    use_llm_cache: bool  # set False to force fresh LLM calls for this claim
+    trace: Annotated[list, operator.add]  # one span per node run; see utils/tracing.py
+    degraded: Annotated[list, operator.add]  # stages skipped because a backend was unavailable
+
+# A claim carries one or more images in `assets`; callers with a single image
+# can pass just `file_path` and ASSETS turns it into a one-item list. The
+# per-image nodes (DUPLICATE_CHECK, EXIF, PREPROCESS, VISION_LABELS, OCR) run
+# their images in parallel, write per-image results into `assets` and the
+# claim-level aggregate into the top-level keys. Everything from EXTRACT on
+# runs once per claim, so a six-photo claim makes one extraction and one
+# decision call, not six.
+#
+# DUPLICATE_CHECK and EXIF are local and cheap, so they run first and in
+# parallel. RULES then applies the deterministic checks in utils/rules.py: a
+# claim that hits one (missing EXIF, policy dates, duplicate image) is decided
+# there without paying for Vision or any LLM call. Otherwise PREPROCESS decodes
+# the image once into a downscaled Vision JPEG and a grayscale OCR variant,
+# and VISION_LABELS and OCR run in parallel on those. Each node returns just
+# the keys it writes; LangGraph merges the partial updates into ClaimState
+# before EXTRACT runs.
+#
+# Every node that does I/O has an async twin (a-prefixed). The graph registers
+# both, so `claim_agent.invoke(state)` uses the blocking versions while
+# `await claim_agent.ainvoke(state)` runs the whole claim on the event loop:
+# remote calls use the async client APIs and local CPU work (EXIF, Tesseract)
+# is pushed to a worker thread.
+
+# Assets
+def collect_assets(state: ClaimState) -> ClaimState:
+    assets = state.get("assets") or [
+        {"file_path": state["file_path"], **({"exif": state["exif"]} if "exif" in state else {})}
+    ]
+    assets = [{"name": os.path.basename(a["file_path"]), **a} for a in assets]
+    return {"assets": assets, "file_path": state.get("file_path") or assets[0]["file_path"]}
+
+def _map_assets(fn, assets):
+    """[fn(asset) for asset in assets], on the asset pool when there is more than one."""
+    if len(assets) == 1:
+        return [fn(assets[0])]
+    pool = get_client("asset_pool")
+    # Each task gets its own copy of the context so tracing still sees the node's span
+    futures = [pool.submit(contextvars.copy_context().run, fn, asset) for asset in assets]
+    return [future.result() for future in futures]
+
+async def _amap_assets(fn, assets):
+    return await asyncio.gather(*(asyncio.to_thread(fn, asset) for asset in assets))
+
+def _joined(assets, values):
+    # Claim-level text for the prompts: as-is for one image, labelled per image
+    # otherwise, leaving out images with nothing to say
+    if len(assets) == 1:
+        return values[0]
+    return "\n".join(
+        f"[{i}] {asset['name']}: {value}"
+        for i, (asset, value) in enumerate(zip(assets, values), 1) if value
+    )
 
-# EXIF node
-from datetime import datetime
+# Duplicate / near-duplicate image check
+def duplicate_check(state: ClaimState) -> ClaimState:
+    # NumPy is only needed once a claim is submitted, keep it off the import path
+    from utils.image_hash import check_and_register
+
+    claim_id = state.get("claim_id") or os.path.basename(state["file_path"])
+    matches = _map_assets(lambda a: check_and_register(a["file_path"], claim_id), state["assets"])
+    return {
+        "assets": [{"duplicate_of": m} for m in matches],
+        "duplicate_of": [match for m in matches for match in m],
+    }
+
+async def aduplicate_check(state: ClaimState) -> ClaimState:
+    return await asyncio.to_thread(duplicate_check, state)
+
+# Hard rules
+def apply_rules(state: ClaimState) -> ClaimState:
+    update = evaluate_rules(state)
+    if update["rule_hits"]:
+        log.info("Decided by rules: %s", ", ".join(hit["rule"] for hit in update["rule_hits"]))
+    return update
+
+def route_after_rules(state: ClaimState):
+    from langgraph.graph import END
+
+    if state.get("rule_hits"):
+        return END
+    return "PREPROCESS"
+
+# Image preprocessing
+# Decodes each upload once and writes the Vision and OCR variants; both nodes
+# fall back to the original file if an image can't be prepared.
+def preprocess_image(state: ClaimState) -> ClaimState:
+    return {"assets": _map_assets(_prepared, state["assets"])}
+
+async def apreprocess_image(state: ClaimState) -> ClaimState:
+    return {"assets": await _amap_assets(_prepared, state["assets"])}
+
+def _prepared(asset):
+    try:
+        return prepare_image(asset["file_path"])
+    except Exception as e:
+        log.warning("Image preprocessing failed, using the original file: %s", e)
+        return {}
 
+# EXIF node
+# Callers that already parsed EXIF (the Streamlit app shows it before submit)
+# pass it in as state["exif"], or per asset, and the file is not read again.
 def process_exif(state: ClaimState) -> ClaimState:
-    exif = extract_exif_data(state['file_path'])
+    return _exif_update(state, _map_assets(_asset_exif, state["assets"]))
+
+async def aprocess_exif(state: ClaimState) -> ClaimState:
+    return _exif_update(state, await _amap_assets(_asset_exif, state["assets"]))
+
+def _asset_exif(asset):
+    if "exif" in asset:
+        return asset["exif"]
+    return extract_exif_data(asset["file_path"])
+
+def _exif_update(state, exifs):
+    per_asset = [_exif_fields(state, exif) for exif in exifs]
+    if len(per_asset) == 1:
+        return {"assets": per_asset, **per_asset[0]}
+    dates = sorted(a["exif_date"] for a in per_asset if a["exif_date"])
+    return {
+        "assets": per_asset,
+        "exif": _claim_exif(per_asset),
+        "exif_date": dates[0] if dates else None,
+        "gps_available": any(a["gps_available"] for a in per_asset),
+        "gps_coordinates": next((a["gps_coordinates"] for a in per_asset if a["gps_coordinates"]), None),
+        # One photo failing a date check is enough to fail it for the claim
+        "exif_vs_policy": _first_status(per_asset, "exif_vs_policy", ("invalid", "valid")),
+        "exif_vs_dol": _first_status(per_asset, "exif_vs_dol", ("too_far", "approve")),
+    }
+
+# Bills and scanned documents rarely carry EXIF, so a claim only counts as
+# missing EXIF when none of its images has any
+def _claim_exif(assets):
+    return next((a["exif"] for a in assets if a.get("exif")), None)
+
+def _first_status(assets, key, order):
+    statuses = {a[key] for a in assets}
+    return next((status for status in order if status in statuses), "unknown")
+
+def _exif_fields(state, exif):
     exif_date = get_datetime_original(exif) if exif else None
-    state['exif'] = exif
-    state['exif_date'] = str(exif_date) if exif_date else None
-
-    # Check if GPS data is present
-    state["gps_available"] = "GPSInfo" in exif if exif else False
+    update = {
+        "exif": exif,
+        "exif_date": str(exif_date) if exif_date else None,
+        # Check if GPS data is present
+        "gps_available": "GPSInfo" in exif if exif else False,
+        "gps_coordinates": get_gps_coordinates(exif),
+    }
 
     # Policy checks
     policy_start = state["policy_data"].get("policy_date")
@@ -66,14 +273,14 @@ def process_exif(state: ClaimState) -> ClaimState:
                 policy_start if isinstance(policy_start, datetime)
                 else datetime.fromisoformat(str(policy_start))
             )
-            state["exif_vs_policy"] = "valid" if exif_dt >= policy_dt else "invalid"
+            update["exif_vs_policy"] = "valid" if exif_dt >= policy_dt else "invalid"
         except Exception as e:
-            print("EXIF vs Policy parse error:", e)
-            state["exif_vs_policy"] = "unknown"
+            log.debug("EXIF vs policy parse error: %s", e)
+            update["exif_vs_policy"] = "unknown"
     else:
-        state["exif_vs_policy"] = "unknown"
+        update["exif_vs_policy"] = "unknown"
 
-    # EXIF vs DOL (robust parsing and debug prints)
+    # EXIF vs DOL (robust parsing)
     def to_date(val):
         if isinstance(val, datetime):
             return val.date()
@@ -93,75 +300,275 @@ def process_exif(state: ClaimState) -> ClaimState:
     exif_dt = to_date(exif_date)
     dol_dt = to_date(dol)
 
-    print("EXIF_DATE (parsed):", exif_dt)
-    print("DOL (parsed):", dol_dt)
-    print("THRESHOLD:", threshold)
+    log.debug("EXIF date %s, DOL %s, threshold %s", exif_dt, dol_dt, threshold)
 
     if exif_dt and dol_dt:
         diff = abs((dol_dt - exif_dt).days)
-        print("DATE DIFF:", diff)
-        state["exif_vs_dol"] = "approve" if diff <= threshold else "too_far"
+        log.debug("EXIF to DOL: %s days", diff)
+        update["exif_vs_dol"] = "approve" if diff <= threshold else "too_far"
     else:
-        state["exif_vs_dol"] = "unknown"
+        update["exif_vs_dol"] = "unknown"
+
+    return update
 
-    return state
 
+# Remote stages degrade instead of failing the claim: when a backend is down
+# (retries exhausted or circuit open) the stage is recorded in `degraded` and
+# FINAL_DECISION sends the claim to manual review.
+def _degraded(stage, error):
+    log.warning("%s degraded: %s", stage, error)
+    return {"degraded": [{"stage": stage, "backend": error.backend, "reason": error.reason}]}
 
 # Vision Labels
+# Every image of the claim goes out in one batch_annotate_images request
 def process_vision_labels(state: ClaimState) -> ClaimState:
-    labels = get_image_labels(state['file_path'])
-    state['image_labels'] = ", ".join(labels) if labels else "No labels found"
-
+    try:
+        return _labels_update(state, annotate_images([_vision_path(a) for a in state["assets"]]))
+    except BackendUnavailable as e:
+        return {"image_labels": "Unavailable", "image_relevance": False, **_degraded("VISION_LABELS", e)}
+
+async def aprocess_vision_labels(state: ClaimState) -> ClaimState:
+    try:
+        results = await aannotate_images([_vision_path(a) for a in state["assets"]])
+        return _labels_update(state, results)
+    except BackendUnavailable as e:
+        return {"image_labels": "Unavailable", "image_relevance": False, **_degraded("VISION_LABELS", e)}
+
+def _vision_path(asset):
+    return asset.get("vision_path") or asset["file_path"]
+
+def _labels_update(state, results):
     # Rough heuristic: If label includes any of the user-mentioned keywords, it's relevant
     user_text = state.get("user_text", "").lower()
-    state["image_relevance"] = any(lbl.lower() in user_text for lbl in labels)
-    return state
-
-# Summary LLM
-def summarize(state: ClaimState) -> ClaimState:
+    per_asset = []
+    for asset, result in zip(state["assets"], results):
+        # An image Vision can't read (corrupt, unsupported) is marked on its
+        # own; the claim's other images still count
+        if result["error"]:
+            log.warning("Vision could not label %s: %s", asset["name"], result["error"])
+            per_asset.append({"image_labels": "Unavailable", "image_relevance": False, "label_error": result["error"]})
+            continue
+        labels = result["labels"]
+        per_asset.append({
+            "image_labels": ", ".join(labels) if labels else "No labels found",
+            "image_relevance": any(lbl.lower() in user_text for lbl in labels),
+        })
+    return {
+        "assets": per_asset,
+        "image_labels": _joined(state["assets"], [a["image_labels"] for a in per_asset]),
+        "image_relevance": any(a["image_relevance"] for a in per_asset),
+    }
+
+# OCR
+def process_ocr(state: ClaimState) -> ClaimState:
+    return _ocr_update(state, _map_assets(_asset_text, state["assets"]))
+
+async def aprocess_ocr(state: ClaimState) -> ClaimState:
+    texts = await asyncio.gather(*(
+        aextract_text_from_image(a.get("ocr_path") or a["file_path"]) for a in state["assets"]
+    ))
+    return _ocr_update(state, texts)
+
+def _asset_text(asset):
+    return extract_text_from_image(asset.get("ocr_path") or asset["file_path"])
+
+def _ocr_update(state, texts):
+    return {
+        "assets": [{"ocr_text": text} for text in texts],
+        "ocr_text": _joined(state["assets"], [(text or "").strip() for text in texts]),
+    }
+
+# Structured extraction LLM
+# One call returns the summary and the key facts as a typed schema. `summary`
+# and `key_info` keep their old text form for the UI and the PDF report.
+def extract_claim_info(state: ClaimState) -> ClaimState:
+    try:
+        extraction = extract_claim(_claim_input(state), use_cache=_use_cache(state))
+    except (BackendUnavailable, SchemaMismatch) as e:
+        return _degraded("EXTRACT", e)
+    return _extraction_update(extraction)
+
+async def aextract_claim_info(state: ClaimState) -> ClaimState:
+    try:
+        extraction = await aextract_claim(_claim_input(state), use_cache=_use_cache(state))
+    except (BackendUnavailable, SchemaMismatch) as e:
+        return _degraded("EXTRACT", e)
+    return _extraction_update(extraction)
+
+def _extraction_update(extraction):
+    return {
+        "extraction": extraction,
+        "summary": format_summary(extraction),
+        "key_info": format_key_info(extraction),
+    }
+
+def _use_cache(state):
+    return state.get("use_llm_cache", True)
+
+def _claim_input(state):
     user_text = state.get("user_text", "")
     labels = state.get("image_labels", "")
+    ocr_text = (state.get("ocr_text") or "").strip() or "No text detected"
 
-    summary_input = f"""
+    claim_input = f"""
 === USER CLAIM TEXT ===
 {user_text}
 
 === IMAGE CONTENT LABELS (Google Vision) ===
 {labels}
 
-=== TASK ===
-1. Summarize the user's claim.
-2. Comment whether image labels support the claim.
-
-Return:
-- 📝 Summary:
-- 🔍 Visual Label Relevance:
+=== TEXT EXTRACTED FROM IMAGE (OCR) ===
+{ocr_text}
 """
-    summary = summarize_text(summary_input)
-    state["summary"] = summary
-    return state
-
-# Key Info
-def extract_keyinfo(state: ClaimState) -> ClaimState:
-    key_info = extract_key_info(state["summary"])
-    state["key_info"] = key_info
-    return state
+    return claim_input
 
-# Misrepresentation
+# Misrepresentation (local, no LLM call)
 def misrep_check(state: ClaimState) -> ClaimState:
-    result = detect_misrepresentation(state["key_info"], state["policy_data"])
-    state["misrep"] = result
-    state["misrep_found"] = "yes" in result.get("verdict", "").lower()
-    return state
+    if not state.get("extraction"):
+        return {"misrep": "Not checked (claim details were not extracted).", "misrep_found": False}
+    result = detect_misrepresentation(state.get("extraction"), state["policy_data"])
+    found = result["misrepresentation_found"] == "Yes"
+    return {
+        "misrep": f"Yes: {result['reason']}" if found else "No misrepresentation found.",
+        "misrep_found": found,
+    }
 
 # Similar Claims
+# Looks up past claims, then adds this one to the index for future lookups
 def similar_claims(state: ClaimState) -> ClaimState:
-    similar = retrieve_similar_claims(state["summary"])
-    state["similar_claims"] = similar
-    return state
+    # NumPy is only needed once a claim gets this far, keep it off the import path
+    from utils.similar_claims import retrieve_similar_claims, record_claim
+
+    summary, key_info = state.get("summary", ""), state.get("key_info", "")
+    if not summary:
+        return {"similar_claims": "Not available (claim was not summarized)."}
+    claim_id = state.get("claim_id") or os.path.basename(state.get("file_path", ""))
+    similar = retrieve_similar_claims(summary, key_info, exclude_claim_id=claim_id)
+    record_claim(claim_id, summary, key_info, file_path=state.get("file_path"))
+    return {"similar_claims": similar}
+
+async def asimilar_claims(state: ClaimState) -> ClaimState:
+    return await asyncio.to_thread(similar_claims, state)
 
 # Final Verdict
 def final_decision(state: ClaimState) -> ClaimState:
+    if state.get("degraded"):
+        return {"final_decision": _manual_review(state["degraded"])}
+    prompt = _decision_prompt(state)
+
+    def call():
+        llm = get_client("decision_llm")
+        stream = _DecisionStream()
+        try:
+            message = resilient_call("gemini", lambda: _streamed(llm, prompt, stream))
+        finally:
+            stream.close()
+        record_usage(DECISION_MODEL, message, prompt, message.content)
+        return message.content
+
+    try:
+        decision = cached_completion(
+            DECISION_MODEL, DECISION_PARAMS, prompt, call, use_cache=_use_cache(state)
+        )
+    except BackendUnavailable as e:
+        update = _degraded("FINAL_DECISION", e)
+        return {"final_decision": _manual_review(update["degraded"]), **update}
+    return {"final_decision": decision}
+
+async def afinal_decision(state: ClaimState) -> ClaimState:
+    if state.get("degraded"):
+        return {"final_decision": _manual_review(state["degraded"])}
+    prompt = _decision_prompt(state)
+
+    async def call():
+        llm = get_client("decision_llm")
+        stream = _DecisionStream()
+        try:
+            message = await aresilient_call("gemini", lambda: _astreamed(llm, prompt, stream))
+        finally:
+            stream.close()
+        record_usage(DECISION_MODEL, message, prompt, message.content)
+        return message.content
+
+    try:
+        decision = await acached_completion(
+            DECISION_MODEL, DECISION_PARAMS, prompt, call, use_cache=_use_cache(state)
+        )
+    except BackendUnavailable as e:
+        update = _degraded("FINAL_DECISION", e)
+        return {"final_decision": _manual_review(update["degraded"]), **update}
+    return {"final_decision": decision}
+
+# The decision is streamed: the verdict is on the first line, so callers of
+# stream_claim() can show it while the explanation is still being generated.
+# Each custom stream event carries the text so far; under invoke() the
+# writer does nothing.
+#
+# resilient_call may run several attempts of the call: a retry after a
+# timeout, or a hedged duplicate, while the first one keeps running on its
+# pool thread. Each attempt writes under its own id and only the newest
+# attempt that has written reaches the stream, so the text never interleaves
+# two answers; once the call returns, stragglers are dropped too.
+class _DecisionStream:
+    def __init__(self):
+        self._write = _stream_writer()
+        self._ids = itertools.count(1)
+        self._latest = 0
+        self._closed = False
+        self._lock = threading.Lock()
+
+    def attempt(self):
+        return next(self._ids)
+
+    def write(self, attempt, text):
+        with self._lock:
+            if self._closed or attempt < self._latest:
+                return
+            self._latest = attempt
+            self._write({"final_decision": text})
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+
+def _streamed(llm, prompt, stream):
+    attempt, message = stream.attempt(), None
+    for chunk in llm.stream(prompt):
+        message = chunk if message is None else message + chunk
+        stream.write(attempt, message.content)
+    return _streamed_message(message)
+
+async def _astreamed(llm, prompt, stream):
+    attempt, message = stream.attempt(), None
+    async for chunk in llm.astream(prompt):
+        message = chunk if message is None else message + chunk
+        stream.write(attempt, message.content)
+    return _streamed_message(message)
+
+def _streamed_message(message):
+    # A stream that closes before the first chunk is a dropped connection:
+    # raise something resilient_call retries
+    if message is None:
+        raise ConnectionError("decision stream ended without a response")
+    return message
+
+def _stream_writer():
+    from langgraph.config import get_stream_writer
+
+    try:
+        return get_stream_writer()
+    except RuntimeError:  # called outside a graph run
+        return lambda chunk: None
+
+def _manual_review(degraded):
+    stages = ", ".join(d["stage"] for d in degraded)
+    lines = [f"FLAG: Automated review incomplete ({stages} unavailable); sent for manual review."]
+    lines += [f"- {d['stage']}: {d['backend']} {d['reason']}" for d in degraded]
+    return "\n".join(lines)
+
+def _decision_prompt(state):
+    from langchain.prompts import PromptTemplate
+
     prompt = PromptTemplate(
         input_variables=[
             "summary", "misrep", "similar_claims", "exif_date",
@@ -210,39 +617,351 @@ def final_decision(state: ClaimState) -> ClaimState:
 
     )
 
-    result = llm.invoke(prompt.format(
+    return prompt.format(
         summary=state.get("summary", ""),
         misrep=state.get("misrep", ""),
         similar_claims=state.get("similar_claims", ""),
-        exif_date=state.get("exif_date", "Not available"),
+        exif_date=_exif_dates(state),
         policy_start=state["policy_data"].get("policy_date", "Not provided"),
         dol=state["policy_data"].get("dol", "Not provided"),
         labels=state.get("image_labels", "No labels")
-    ))
+    )
 
-    state["final_decision"] = result.content
-    return state
+def _exif_dates(state):
+    assets = state.get("assets") or []
+    if len(assets) <= 1:
+        return state.get("exif_date", "Not available")
+    return _joined(assets, [a.get("exif_date") or "missing" for a in assets])
 
 
 
 # LangGraph setup
-workflow = StateGraph(ClaimState)
-workflow.add_node("EXIF", process_exif)
-workflow.add_node("VISION_LABELS", process_vision_labels)
-workflow.add_node("SUMMARIZE", summarize)
-workflow.add_node("KEY_INFO", extract_keyinfo)
-workflow.add_node("MISREP_CHECK", misrep_check)
-# workflow.add_node("SIMILAR_CLAIMS", similar_claims)
-workflow.add_node("FINAL_DECISION", final_decision)
-
-workflow.set_entry_point("EXIF")
-workflow.add_edge("EXIF", "VISION_LABELS")
-workflow.add_edge("VISION_LABELS", "SUMMARIZE")
-workflow.add_edge("SUMMARIZE", "KEY_INFO")
-workflow.add_edge("KEY_INFO", "MISREP_CHECK")
-workflow.add_edge("MISREP_CHECK", "FINAL_DECISION")
-# workflow.add_edge("MISREP_CHECK", "SIMILAR_CLAIMS")
-# workflow.add_edge("SIMILAR_CLAIMS", "FINAL_DECISION")
-workflow.add_edge("FINAL_DECISION", END)
-
-claim_agent = workflow.compile()
+def build_workflow():
+    from langgraph.graph import StateGraph, START, END
+
+    workflow = StateGraph(ClaimState)
+    workflow.add_node("ASSETS", _node("ASSETS", collect_assets))
+    workflow.add_node("DUPLICATE_CHECK", _node("DUPLICATE_CHECK", duplicate_check, aduplicate_check))
+    workflow.add_node("EXIF", _node("EXIF", process_exif, aprocess_exif))
+    workflow.add_node("RULES", _node("RULES", apply_rules))
+    workflow.add_node("PREPROCESS", _node("PREPROCESS", preprocess_image, apreprocess_image))
+    workflow.add_node("VISION_LABELS", _node("VISION_LABELS", process_vision_labels, aprocess_vision_labels))
+    workflow.add_node("OCR", _node("OCR", process_ocr, aprocess_ocr))
+    workflow.add_node("EXTRACT", _node("EXTRACT", extract_claim_info, aextract_claim_info))
+    workflow.add_node("MISREP_CHECK", _node("MISREP_CHECK", misrep_check))
+    workflow.add_node("SIMILAR_CLAIMS", _node("SIMILAR_CLAIMS", similar_claims, asimilar_claims))
+    workflow.add_node("FINAL_DECISION", _node("FINAL_DECISION", final_decision, afinal_decision))
+
+    # Claims decided by a hard rule stop at RULES; everything else fans out to
+    # the paid per-image nodes, which join before EXTRACT
+    workflow.add_edge(START, "ASSETS")
+    workflow.add_edge("ASSETS", "DUPLICATE_CHECK")
+    workflow.add_edge("ASSETS", "EXIF")
+    workflow.add_edge(["DUPLICATE_CHECK", "EXIF"], "RULES")
+    workflow.add_conditional_edges("RULES", route_after_rules, [END, "PREPROCESS"])
+    workflow.add_edge("PREPROCESS", "VISION_LABELS")
+    workflow.add_edge("PREPROCESS", "OCR")
+    workflow.add_edge(["VISION_LABELS", "OCR"], "EXTRACT")
+    # The misrepresentation check and the similar-claims lookup are independent
+    workflow.add_edge("EXTRACT", "MISREP_CHECK")
+    workflow.add_edge("EXTRACT", "SIMILAR_CLAIMS")
+    workflow.add_edge(["MISREP_CHECK", "SIMILAR_CLAIMS"], "FINAL_DECISION")
+    workflow.add_edge("FINAL_DECISION", END)
+    return workflow
+
+# The ClaimState keys each node's update depends on (see utils/node_cache.py).
+# A node listed here is skipped when these are unchanged since it last ran.
+# Vision and OCR read the variants PREPROCESS derives from the file, so the
+# file's content stands in for them. ASSETS, RULES and MISREP_CHECK are local
+# and cheaper to run than to look up; PREPROCESS keeps its own cache by image.
+NODE_READS = {
+    "DUPLICATE_CHECK": ("claim_id", "assets.file_path"),
+    "EXIF": ("assets.file_path", "assets.exif", "policy_data"),
+    "VISION_LABELS": ("assets.file_path", "user_text"),
+    "OCR": ("assets.file_path",),
+    "EXTRACT": ("user_text", "image_labels", "ocr_text"),
+    "SIMILAR_CLAIMS": ("claim_id", "file_path", "summary", "key_info"),
+    "FINAL_DECISION": (
+        "summary", "misrep", "similar_claims", "exif_date", "assets.exif_date",
+        "policy_data.policy_date", "policy_data.dol", "image_labels", "degraded",
+    ),
+}
+
+# Every node reports its wall time, external calls, tokens and cache hits
+def _node(name, func, afunc=None):
+    from langchain_core.runnables import RunnableLambda
+
+    if name in NODE_READS:
+        reuse = reuse_outputs(name, NODE_READS[name])
+        func, afunc = reuse(func), afunc and reuse(afunc)
+    if afunc is None:
+        return traced(name, func)
+    return RunnableLambda(traced(name, func), traced(name, afunc))
+
+
+_claim_agent = None
+_claim_agent_lock = threading.Lock()
+
+def get_claim_agent():
+    """Compile the claim graph on first use and return the shared instance."""
+    global _claim_agent
+    if _claim_agent is None:
+        with _claim_agent_lock:
+            if _claim_agent is None:
+                _claim_agent = build_workflow().compile()
+    return _claim_agent
+
+def __getattr__(name):
+    # Keeps `from claim_agent import claim_agent` working without compiling at import
+    if name == "claim_agent":
+        return get_claim_agent()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+# The checkpointed graph (utils/checkpoints.py) lives in the client registry
+# so a forked worker opens its own SQLite connection
+register("claim_graph", lambda: build_workflow().compile(checkpointer=make_saver()))
+
+
+# Batch processing
+# Every claim runs as its own checkpoint thread, keyed by claim_id. Running a
+# claim ID again picks up where the last run stopped: a run that raised
+# resumes at the first unfinished node, and a finished claim returns its
+# stored result without calling anything, unless a stage of it degraded. A
+# claim ID sent again with other inputs (new dates or threshold, a different
+# description or set of images) is evaluated afresh, and NODE_READS keeps that
+# to the nodes the change affects.
+def process_claims(states, max_workers=4):
+    """Run many claim states through the graph concurrently.
+
+    At most `max_workers` claims are in flight at once; a slow claim only
+    occupies its own worker. Returns one entry per input, in input order:
+    the final state, or the exception raised while processing that claim.
+    """
+    agent = get_client("claim_graph")
+    configs = [_claim_config(s, max_workers) for s in states]
+    snapshots = [_snapshot(agent, c, s) for c, s in zip(configs, states)]
+    results = [s.values if is_finished(s) else None for s in snapshots]
+    todo = [i for i, r in enumerate(results) if r is None]
+
+    inputs = _run_inputs([states[i] for i in todo], [snapshots[i] for i in todo])
+    prefetch = threading.Thread(
+        target=contextvars.copy_context().run, args=(_prefetch_labels, [x for x in inputs if x is not None]),
+        name="label-prefetch", daemon=True,
+    )
+    prefetch.start()
+    outputs = agent.batch(inputs, config=[configs[i] for i in todo], return_exceptions=True)
+    prefetch.join()
+    for i, output in zip(todo, outputs):
+        results[i] = output
+    _export_traces(outputs)
+    return results
+
+
+async def aprocess_claims(states, max_concurrency=16):
+    """Async counterpart of process_claims, built on abatch.
+
+    Claims share the caller's event loop instead of a thread each, so
+    `max_concurrency` can be set well above a sensible thread count.
+    """
+    agent = get_client("claim_graph")
+    configs = [_claim_config(s, max_concurrency) for s in states]
+    snapshots = [await asyncio.to_thread(_snapshot, agent, c, s) for c, s in zip(configs, states)]
+    results = [s.values if is_finished(s) else None for s in snapshots]
+    todo = [i for i, r in enumerate(results) if r is None]
+
+    inputs = await asyncio.to_thread(_run_inputs, [states[i] for i in todo], [snapshots[i] for i in todo])
+    prefetch = asyncio.create_task(_aprefetch_labels([x for x in inputs if x is not None]))
+    outputs = await agent.abatch(inputs, config=[configs[i] for i in todo], return_exceptions=True)
+    await prefetch
+    for i, output in zip(todo, outputs):
+        results[i] = output
+    await asyncio.to_thread(_export_traces, outputs)
+    return results
+
+
+def run_claim(state):
+    """Run (or resume) one claim with checkpoints and return its final state."""
+    for event, value in stream_claim(state):
+        pass
+    return value
+
+def stream_claim(state):
+    """Run (or resume) one claim like run_claim, yielding progress as it happens.
+
+    Yields ("node", name) as each node finishes, ("final_decision", text)
+    with the decision generated so far while the LLM is still writing it (or
+    once, whole, when the rules or a cache decided), and finally ("done",
+    final_state). Raises if the run fails.
+    """
+    agent = get_client("claim_graph")
+    config = thread_config(state.get("claim_id") or uuid.uuid4().hex)
+    snapshot = _snapshot(agent, config, state)
+    if not is_finished(snapshot):
+        inputs = _run_inputs([state], [snapshot])[0]
+        decision = None
+        for mode, chunk in agent.stream(inputs, config, stream_mode=["updates", "custom"]):
+            if mode == "custom":
+                decision = chunk["final_decision"]
+                yield "final_decision", decision
+                continue
+            for name, update in chunk.items():
+                # A decision from the rules or a cache never streamed; send it whole
+                final = update.get("final_decision") if isinstance(update, dict) else None
+                if final and final != decision:
+                    decision = final
+                    yield "final_decision", decision
+                yield "node", name
+        snapshot = agent.get_state(config)
+        _export_traces([snapshot.values])
+    yield "done", snapshot.values
+
+def _claim_config(state, max_concurrency):
+    # Claims without an ID get a throwaway thread and cannot be resumed
+    claim_id = state.get("claim_id") or uuid.uuid4().hex
+    return {**thread_config(claim_id), "max_concurrency": max_concurrency}
+
+def _snapshot(agent, config, state):
+    # A finished run with a degraded stage is run again too: the node cache
+    # skips the stages that worked and the degraded ones retry their backend
+    snapshot = agent.get_state(config)
+    retry = is_finished(snapshot) and snapshot.values.get("degraded")
+    if snapshot.values and (retry or _inputs_changed(state, snapshot.values)):
+        agent.checkpointer.delete_thread(config["configurable"]["thread_id"])
+        snapshot = agent.get_state(config)
+    return snapshot
+
+def _inputs_changed(state, stored):
+    # Keys the caller left out count as unchanged, so a bare {"claim_id": ...}
+    # still resumes or returns the stored run
+    if any(key in state and state[key] != stored.get(key) for key in ("user_text", "policy_data", "use_llm_cache")):
+        return True
+    paths = [a["file_path"] for a in state.get("assets") or []] or [state.get("file_path")]
+    return paths != [None] and paths != [a["file_path"] for a in stored.get("assets") or []]
+
+def _run_inputs(states, snapshots):
+    # None tells LangGraph to continue from the thread's last checkpoint
+    fresh = iter(_with_exif([s for s, snap in zip(states, snapshots) if not snap.next]))
+    return [None if snap.next else next(fresh) for snap in snapshots]
+
+
+# Stuck claims: runs that stopped partway, or finished with a stage degraded
+def stuck_claims():
+    agent = get_client("claim_graph")
+    stuck = []
+    for claim_id in thread_ids():
+        snapshot = agent.get_state(thread_config(claim_id))
+        if is_stuck(snapshot):
+            stuck.append(describe(claim_id, snapshot))
+    return stuck
+
+def replay_claim(claim_id):
+    """Finish a stuck claim from its checkpoints and return the final state.
+
+    A run that stopped partway resumes at the node that failed. A finished
+    run with degraded stages is forked from the last checkpoint before the
+    first degraded stage, so only the stages from there on run again.
+    """
+    agent = get_client("claim_graph")
+    config = thread_config(claim_id)
+    snapshot = agent.get_state(config)
+    if snapshot.next:
+        start = config
+    elif snapshot.values.get("degraded"):
+        start = next(
+            (s.config for s in agent.get_state_history(config) if s.next and not s.values.get("degraded")),
+            None,
+        )
+    else:
+        start = None
+    if start is None:
+        raise ValueError(f"claim {claim_id} has no checkpoint to resume from")
+    result = agent.invoke(None, start)
+    _export_traces([result])
+    return result
+
+def prune_checkpoints(older_than_days=30):
+    return prune_finished(get_client("claim_graph"), older_than_days)
+
+
+# Labels for a batch are fetched with batched Vision requests while its claims
+# run. Images go out in claim order, a request at a time, so the first claims
+# aren't held up behind the whole batch; a VISION_LABELS node finds its labels
+# in the image cache, or waits for the request already carrying its images.
+# Claims the rules will decide are left out: EXIF is read first (header only)
+# for the EXIF and policy-date rules, and the images are hashed for the
+# duplicate rule. The Vision variants are prepared here too, so the request
+# carries the downscaled JPEGs the nodes will look up and PREPROCESS finds
+# them already on disk.
+def _prefetch_labels(states):
+    try:
+        for paths in _label_groups(states):
+            annotate_images(paths)
+    except Exception as e:
+        log.warning("Batch label prefetch failed, falling back to per-claim calls: %s", e)
+
+async def _aprefetch_labels(states):
+    groups = _label_groups(states)
+    try:
+        while paths := await asyncio.to_thread(next, groups, None):
+            await aannotate_images(paths)
+    except Exception as e:
+        log.warning("Batch label prefetch failed, falling back to per-claim calls: %s", e)
+
+def _with_exif(states):
+    return [_exif_read(s) if s.get("file_path") or s.get("assets") else s for s in states]
+
+def _exif_read(state):
+    assets = collect_assets(state)["assets"]
+    return {**state, "assets": [a if "exif" in a else {**a, "exif": extract_exif_data(a["file_path"])} for a in assets]}
+
+def _label_groups(states):
+    # NumPy is only needed once a claim is submitted, keep it off the import path
+    from utils.image_hash import BatchDuplicates
+    from utils.vision_labels import MAX_IMAGES_PER_REQUEST
+
+    duplicates, seen, paths = BatchDuplicates(), set(), []
+    for state in states:
+        if not state.get("assets"):
+            continue
+        claim_id = state.get("claim_id") or os.path.basename(state.get("file_path") or state["assets"][0]["file_path"])
+        matches = [m for a in state["assets"] for m in duplicates.matches(a["file_path"], claim_id)]
+        if evaluate_rules(_rules_input(state, matches))["rule_hits"]:
+            continue
+        for asset in state["assets"]:
+            if asset["file_path"] not in seen:
+                seen.add(asset["file_path"])
+                paths.append(asset["file_path"])
+        while len(paths) >= MAX_IMAGES_PER_REQUEST:
+            yield _vision_inputs(paths[:MAX_IMAGES_PER_REQUEST])
+            paths = paths[MAX_IMAGES_PER_REQUEST:]
+    if paths:
+        yield _vision_inputs(paths)
+
+def _rules_input(state, matches):
+    # The state RULES will see: the EXIF node's fields (exif_date and the
+    # date checks) and the DUPLICATE_CHECK matches
+    update = _exif_update(
+        {**state, "policy_data": state.get("policy_data") or {}}, [a["exif"] for a in state["assets"]]
+    )
+    del update["assets"]
+    return {**state, **update, "duplicate_of": matches}
+
+def _vision_inputs(paths):
+    # One image at a time: the claims are decoding theirs alongside
+    return [_vision_input(path) for path in paths]
+
+def _vision_input(path):
+    try:
+        return prepare_image(path)["vision_path"]
+    except Exception:
+        return path
+
+def _export_traces(results):
+    for result in results:
+        if isinstance(result, Exception):
+            continue
+        try:
+            export_trace(result)
+        except OSError as e:
+            log.warning("Could not write claim trace: %s", e)
@@ -0,0 +1,250 @@
+"""Command line entry point for the claim pipeline.
+
+    python cli.py serve --port 8502 --workers 4
+    python cli.py worker --workers 8              # extra workers on the same job DB
+    python cli.py submit photo.jpg --text "Fire damaged my laptop" --policy-date 2024-01-01 --dol 2025-05-15
+    python cli.py submit --jsonl claims.jsonl
+    python cli.py status <job_id> [--wait]
+    python cli.py status --list [--state failed]
+    python cli.py run-batch claims.jsonl --out results.jsonl --workers 8
+    python cli.py stuck                           # claims whose run stopped partway or degraded
+    python cli.py replay <claim_id> [...] | --all
+    python cli.py prune-checkpoints --days 30
+
+A claims file has one payload per line, as accepted by POST /jobs (see
+service.py); "file_path" is the usual way to point at an image. run-batch
+always accepts it, the service only when started with CLAIM_SERVICE_FILE_PATHS=1.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+
+
+def cmd_serve(args):
+    from service import serve
+
+    serve(args.host, args.port, args.workers)
+
+def cmd_worker(args):
+    from service import stop_on_sigterm
+    from utils.jobs import WorkerPool
+
+    stop_on_sigterm()
+    pool = WorkerPool(args.workers).start()
+    print(f"{args.workers} worker(s) polling the job queue; Ctrl+C to stop")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        print("Waiting for running jobs to finish...")
+        pool.stop()
+
+def cmd_submit(args):
+    from service import submit_claim
+
+    for payload in _payloads(args):
+        job_id = submit_claim(payload, args.url)
+        print(job_id)
+
+def cmd_status(args):
+    from service import fetch_job, fetch_jobs
+
+    if args.list or not args.job_id:
+        for job in fetch_jobs(args.state, args.url):
+            print(f"{job['job_id']}  {job['status']:<8} {job['claim_id'] or '':<22} {job['error'] or ''}")
+        return
+    job = fetch_job(args.job_id, args.url)
+    while args.wait and job["status"] in ("queued", "running"):
+        time.sleep(1)
+        job = fetch_job(args.job_id, args.url)
+    print(json.dumps(_summary(job), indent=2, default=str))
+    if job["status"] == "failed":
+        sys.exit(1)
+
+def cmd_run_batch(args):
+    # Runs in this process with process_claims, without the service or queue
+    from claim_agent import process_claims
+    from service import claim_state
+
+    with open(args.claims) as f:
+        lines = [line for line in f if line.strip()]
+    # Bad lines are reported in the output instead of stopping the backfill
+    states, records = [], []
+    for line, text in enumerate(lines, 1):
+        payload = None
+        try:
+            payload = json.loads(text)
+            states.append(claim_state(payload, allow_file_paths=True))
+            records.append(None)
+        except (ValueError, TypeError, KeyError, AttributeError) as e:
+            claim_id = payload.get("claim_id") if isinstance(payload, dict) else None
+            records.append({"line": line, "claim_id": claim_id, "error": f"{type(e).__name__}: {e}"})
+    started = time.perf_counter()
+    results = iter(process_claims(states, max_workers=args.workers) if states else [])
+    elapsed = time.perf_counter() - started
+    states = iter(states)
+
+    failed = 0
+    out = open(args.out, "w") if args.out else sys.stdout
+    try:
+        for line, record in enumerate(records, 1):
+            if record is None:
+                state, result = next(states), next(results)
+                if isinstance(result, Exception):
+                    record = {"line": line, "claim_id": state["claim_id"], "error": repr(result)}
+                else:
+                    record = {
+                        "line": line,
+                        "claim_id": state["claim_id"],
+                        "final_decision": result.get("final_decision"),
+                        "final_reason": result.get("final_reason"),
+                    }
+            failed += "error" in record
+            out.write(json.dumps(record, default=str) + "\n")
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    print(f"{len(records)} claim(s) in {elapsed:.1f}s, {failed} failed", file=sys.stderr)
+
+def cmd_stuck(args):
+    from claim_agent import stuck_claims
+
+    stuck = stuck_claims()
+    for claim in stuck:
+        waiting = ", ".join(claim["next"]) or "-"
+        degraded = ", ".join(claim["degraded"]) or "-"
+        print(f"{claim['claim_id']:<24} {claim['updated_at'] or '':<33} next: {waiting:<16} "
+              f"degraded: {degraded:<16} {claim['error'] or ''}")
+    print(f"{len(stuck)} stuck claim(s)", file=sys.stderr)
+
+def cmd_replay(args):
+    from claim_agent import stuck_claims, replay_claim
+    from utils.jobs import jobs_for_claim, record_result
+
+    claim_ids = [c["claim_id"] for c in stuck_claims()] if args.all else args.claim_ids
+    if not claim_ids:
+        sys.exit("give claim IDs or --all")
+    failed = 0
+    for claim_id in claim_ids:
+        try:
+            result = replay_claim(claim_id)
+        except ValueError as e:  # nothing to resume
+            failed += 1
+            print(f"{claim_id}: {e}")
+            continue
+        except Exception as e:
+            failed += 1
+            print(f"{claim_id}: still failing: {e!r}")
+            continue
+        # Jobs for this claim show the replayed result
+        for job_id in jobs_for_claim(claim_id):
+            record_result(job_id, result)
+        print(f"{claim_id}: {(result.get('final_decision') or '').splitlines()[0]}")
+    if failed:
+        sys.exit(1)
+
+def cmd_prune_checkpoints(args):
+    from claim_agent import prune_checkpoints
+
+    removed = prune_checkpoints(args.days)
+    print(f"Removed checkpoints of {removed} finished claim(s)")
+
+
+def _payloads(args):
+    if args.jsonl:
+        with open(args.jsonl) as f:
+            return [json.loads(line) for line in f if line.strip()]
+    if not args.image or not args.text:
+        sys.exit("submit needs an image and --text, or --jsonl")
+    payload = {
+        "user_text": args.text,
+        "policy_data": {"policy_date": args.policy_date, "dol": args.dol, "threshold": args.threshold},
+    }
+    if args.server_path:
+        payload["file_path"] = os.path.abspath(args.image)
+    else:
+        from service import image_payload
+
+        with open(args.image, "rb") as f:
+            payload.update(image_payload(f, os.path.basename(args.image)))
+    return [payload]
+
+def _summary(job):
+    result = job.get("result") or {}
+    return {
+        "job_id": job["job_id"],
+        "claim_id": job["claim_id"],
+        "status": job["status"],
+        "error": job["error"],
+        "final_decision": result.get("final_decision"),
+        "final_reason": result.get("final_reason"),
+        "wall_ms": (job.get("trace") or {}).get("wall_ms"),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Insurance claim pipeline")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("serve", help="run the HTTP service and a worker pool")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=8502)
+    p.add_argument("--workers", type=int, default=4, help="0 serves the API only")
+    p.set_defaults(func=cmd_serve)
+
+    p = sub.add_parser("worker", help="run workers only, against the shared job DB")
+    p.add_argument("--workers", type=int, default=4)
+    p.set_defaults(func=cmd_worker)
+
+    p = sub.add_parser("submit", help="queue claims with the service")
+    p.add_argument("image", nargs="?")
+    p.add_argument("--text", help="claim description")
+    p.add_argument("--policy-date")
+    p.add_argument("--dol")
+    p.add_argument("--threshold", type=int, default=2)
+    p.add_argument("--server-path", action="store_true",
+                   help="send the path instead of the bytes (service shares this filesystem "
+                        "and runs with CLAIM_SERVICE_FILE_PATHS=1)")
+    p.add_argument("--jsonl", help="file with one claim payload per line")
+    p.add_argument("--url", help="service URL (default $CLAIM_SERVICE_URL)")
+    p.set_defaults(func=cmd_submit)
+
+    p = sub.add_parser("status", help="show a job, or list recent jobs")
+    p.add_argument("job_id", nargs="?")
+    p.add_argument("--wait", action="store_true", help="poll until the job finishes")
+    p.add_argument("--list", action="store_true")
+    p.add_argument("--state", choices=["queued", "running", "done", "failed"])
+    p.add_argument("--url")
+    p.set_defaults(func=cmd_status)
+
+    p = sub.add_parser("run-batch", help="process a claims file in this process")
+    p.add_argument("claims", help="file with one claim payload per line")
+    p.add_argument("--out", help="results JSONL (default stdout)")
+    p.add_argument("--workers", type=int, default=4)
+    p.set_defaults(func=cmd_run_batch)
+
+    p = sub.add_parser("stuck", help="list claims whose run stopped partway or degraded")
+    p.set_defaults(func=cmd_stuck)
+
+    p = sub.add_parser("replay", help="resume stuck claims from their checkpoints")
+    p.add_argument("claim_ids", nargs="*")
+    p.add_argument("--all", action="store_true", help="every claim listed by `stuck`")
+    p.set_defaults(func=cmd_replay)
+
+    p = sub.add_parser("prune-checkpoints", help="delete checkpoints of finished claims")
+    p.add_argument("--days", type=float, default=30, help="keep claims updated more recently than this")
+    p.set_defaults(func=cmd_prune_checkpoints)
+
+    args = parser.parse_args(argv)
+    from service import ServiceError
+
+    try:
+        args.func(args)
+    except ServiceError as e:
+        sys.exit(str(e))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,12 @@
 import streamlit as st
-import os
-from datetime import datetime
-from PIL import Image, ExifTags
-from claim_agent import claim_agent
+import time
+from service import submit_claim, fetch_job, ServiceError
+from utils.ingest import ingest_upload
+from utils.previews import upload_digest, preview_jpeg, upload_exif
 import pandas as pd
 
+POLL_SECONDS = 0.25
+
 st.set_page_config(page_title="🏚️ Insurance Claim Agent", layout="centered")
 
 st.title("🏚️ House Insurance Claim - AI Workflow")
@@ -12,26 +14,24 @@ st.title("🏚️ House Insurance Claim - AI Workflow")
 uploaded_file = st.file_uploader("📂 Upload a Claim Image (JPG, PNG)", type=["jpg", "jpeg", "png"])
 
 # ---- EXIF Debugging Section ----
+# EXIF is parsed once per upload from the metadata segment and handed to the
+# agent; the preview and EXIF are cached, so widget changes don't redo them
+exif_summary = None
 if uploaded_file:
-    image = Image.open(uploaded_file)
-    st.image(image, caption="Uploaded Image", use_column_width=True)
+    upload_bytes = uploaded_file.getvalue()
+    photo_hash = upload_digest(upload_bytes)
+    st.image(preview_jpeg(photo_hash, upload_bytes), caption="Uploaded Image", use_column_width=True)
 
     st.subheader("🪪 EXIF Data (Important Fields)")
-    exif_data = image._getexif()
-    if exif_data:
-        exif = {
-            ExifTags.TAGS.get(k, k): v
-            for k, v in exif_data.items()
-            if k in ExifTags.TAGS
-        }
-        important_fields = ["DateTimeOriginal", "Make", "Model", "GPSInfo"]
-        for field in important_fields:
-            value = exif.get(field)
-            if value:
-                if field == "GPSInfo":
-                    st.write("**GPSInfo:**", value)
-                else:
-                    st.write(f"**{field}:** {value}")
+    exif_summary = upload_exif(photo_hash, upload_bytes)
+    if exif_summary["exif"]:
+        st.write(f"**DateTimeOriginal:** {exif_summary['datetime_original'] or 'Not found'}")
+        for field in ["make", "model"]:
+            if exif_summary[field]:
+                st.write(f"**{field.title()}:** {exif_summary[field]}")
+        if exif_summary["gps"]:
+            lat, lon = exif_summary["gps"]
+            st.write(f"**GPS:** {lat:.6f}, {lon:.6f}")
     else:
         st.warning("No EXIF metadata found in this image.")
 
@@ -47,16 +47,19 @@ if st.button("🚀 Submit Claim"):
     if not uploaded_file or not user_claim_text.strip():
         st.warning("⚠️ Please upload an image and provide claim description.")
     else:
-        os.makedirs("data/uploaded_images", exist_ok=True)
-        file_id = datetime.now().strftime("%Y%m%d%H%M%S%f")
-        file_path = f"data/uploaded_images/{file_id}_{uploaded_file.name}"
-        with open(file_path, "wb") as f:
-            f.write(uploaded_file.getbuffer())
-
-        st.subheader(f"🖼️ Processing: {uploaded_file.name}")
-
-        state = {
-            "file_path": file_path,
+        # The UI and the claim service (python cli.py serve) share the asset
+        # store in utils/ingest.py: the upload is streamed into it here and
+        # only its asset ID is sent; the service processes the claim
+        upload = ingest_upload(uploaded_file, uploaded_file.name)
+        # Resubmitting the same photo (e.g. with new dates or threshold)
+        # re-evaluates its claim, and only the affected steps run again
+        claim_ids = st.session_state.setdefault("claim_ids", {})
+        claim_id = claim_ids.setdefault(photo_hash, upload["upload_id"])
+        payload = {
+            "claim_id": claim_id,
+            "asset_id": upload["asset_id"],
+            "filename": uploaded_file.name,
+            "exif": exif_summary["exif"],
             "user_text": user_claim_text,
             "policy_data": {
                 "policy_date": policy_date.isoformat(),
@@ -64,11 +67,136 @@ if st.button("🚀 Submit Claim"):
                 "threshold": threshold,
             },
         }
-
+        try:
+            st.session_state["job"] = (submit_claim(payload), uploaded_file.name)
+        except ServiceError as e:
+            st.error(f"⚠️ {e}")
+
+
+APPROVED_BLOCK = """
+<div style='
+    font-size:36px;
+    font-weight:bold;
+    color:green;
+    background: linear-gradient(90deg, #eaffd0 0%, #d0ffd6 100%);
+    border-radius: 16px;
+    padding: 32px;
+    text-align:center;
+    box-shadow: 0 4px 24px rgba(0,128,0,0.1);'>
+    🎉✅ CLAIM APPROVED!<br>
+    <span style='font-size:24px; color:#222; font-weight:normal;'>
+        Congratulations! Your claim has been successfully approved.<br>
+        We appreciate your patience and cooperation.<br>
+        <span style='font-size:36px;'>🎊</span>
+    </span>
+</div>
+"""
+
+REJECTED_BLOCK = """
+<div style='
+    font-size:36px;
+    font-weight:bold;
+    color:#b00020;
+    background: linear-gradient(90deg, #ffe0e0 0%, #ffd6d6 100%);
+    border-radius: 16px;
+    padding: 32px;
+    text-align:center;
+    box-shadow: 0 4px 24px rgba(255,0,0,0.07);'>
+    ❌ CLAIM REJECTED<br>
+    <span style='font-size:24px; color:#222; font-weight:normal;'>
+        We regret to inform you that your claim could not be approved.<br>
+        Please check the reason below or contact support for further assistance.
+    </span>
+</div>
+"""
+
+UNDER_REVIEW_BLOCK = """
+<div style='
+    font-size:36px;
+    font-weight:bold;
+    color:#c77f00;
+    background: linear-gradient(90deg, #fff6d0 0%, #ffeccd 100%);
+    border-radius: 16px;
+    padding: 32px;
+    text-align:center;
+    box-shadow: 0 4px 24px rgba(255,140,0,0.07);'>
+    🕵️ UNDER REVIEW<br>
+    <span style='font-size:24px; color:#222; font-weight:normal;'>
+        Your claim is currently under review by our team.<br>
+        We will notify you with an update soon.<br>
+        Thank you for your patience.
+    </span>
+</div>
+"""
+
+
+def verdict_block(decision):
+    """Banner for a decision whose first line starts with APPROVE, REJECT or FLAG."""
+    decision = decision.strip().lower()
+    if decision.startswith("approve"):
+        return APPROVED_BLOCK
+    if decision.startswith("reject"):
+        return REJECTED_BLOCK
+    return UNDER_REVIEW_BLOCK
+
+
+def wait_for_job(job_id, on_progress=None, timeout=600):
+    deadline = time.monotonic() + timeout
+    job = fetch_job(job_id)
+    while job["status"] in ("queued", "running") and time.monotonic() < deadline:
+        if on_progress:
+            on_progress(job)
+        time.sleep(POLL_SECONDS)
+        job = fetch_job(job_id)
+    return job
+
+def show_progress(job, status, banner, reason):
+    # The worker records finished nodes and the decision as it streams in;
+    # the verdict banner goes up as soon as the first line is complete
+    progress = job.get("progress") or {}
+    nodes = progress.get("nodes") or []
+    status.caption(f"Finished: {', '.join(nodes)}" if nodes else f"Claim is {job['status']}...")
+    decision = progress.get("final_decision") or ""
+    if "\n" in decision:
+        verdict, _, explanation = decision.partition("\n")
+        banner.markdown(verdict_block(verdict), unsafe_allow_html=True)
+        reason.markdown(f"**{verdict.strip()}**\n\n{explanation}")
+
+
+# Kept in session state so a rerun keeps polling the same job instead of resubmitting
+if "job" in st.session_state:
+    job_id, file_name = st.session_state["job"]
+    st.subheader(f"🖼️ Processing: {file_name}")
+
+    status, banner, reason = st.empty(), st.empty(), st.empty()
+    try:
         with st.spinner("🤖 Running AI agent..."):
-            result = claim_agent.invoke(state)
-
-        print(result)
+            job = wait_for_job(job_id, lambda job: show_progress(job, status, banner, reason))
+    except ServiceError as e:
+        job = {"status": "failed", "error": str(e)}
+    if job["status"] not in ("queued", "running"):
+        # The full report below replaces the streamed preview
+        for placeholder in (status, banner, reason):
+            placeholder.empty()
+
+    if job["status"] in ("queued", "running"):
+        st.info(f"⏳ Claim is still {job['status']} (job {job_id}). Rerun the page to check again.")
+    elif job["status"] == "failed":
+        st.error(f"❌ Processing failed: {job['error']}")
+    else:
+        result, record = job["result"], job["trace"]
+        if record:
+            with st.expander(f"⏱️ Timing breakdown ({record['wall_ms']:.0f} ms)"):
+                st.table(pd.DataFrame([
+                    {
+                        "Node": span["node"],
+                        "ms": span["ms"],
+                        "External calls": ", ".join(f"{c['service']} {c['ms']:.0f} ms" for c in span["calls"]),
+                        "Tokens": span["tokens"]["prompt"] + span["tokens"]["completion"],
+                        "Cache hits": span["cache"]["hits"],
+                    }
+                    for span in record["nodes"]
+                ]))
 
         st.markdown("## 📊 Summary of Evaluation")
 
@@ -102,71 +230,9 @@ if st.button("🚀 Submit Claim"):
         st.markdown("## 🧾 Final Verdict")
 
         final_decision = result.get("final_decision", "").strip().lower()
-        approved_block = """
-        <div style='
-            font-size:36px;
-            font-weight:bold;
-            color:green;
-            background: linear-gradient(90deg, #eaffd0 0%, #d0ffd6 100%);
-            border-radius: 16px;
-            padding: 32px;
-            text-align:center;
-            box-shadow: 0 4px 24px rgba(0,128,0,0.1);'>
-            🎉✅ CLAIM APPROVED!<br>
-            <span style='font-size:24px; color:#222; font-weight:normal;'>
-                Congratulations! Your claim has been successfully approved.<br>
-                We appreciate your patience and cooperation.<br>
-                <span style='font-size:36px;'>🎊</span>
-            </span>
-        </div>
-        """
-
-        rejected_block = """
-        <div style='
-            font-size:36px;
-            font-weight:bold;
-            color:#b00020;
-            background: linear-gradient(90deg, #ffe0e0 0%, #ffd6d6 100%);
-            border-radius: 16px;
-            padding: 32px;
-            text-align:center;
-            box-shadow: 0 4px 24px rgba(255,0,0,0.07);'>
-            ❌ CLAIM REJECTED<br>
-            <span style='font-size:24px; color:#222; font-weight:normal;'>
-                We regret to inform you that your claim could not be approved.<br>
-                Please check the reason below or contact support for further assistance.
-            </span>
-        </div>
-        """
-
-        under_review_block = """
-        <div style='
-            font-size:36px;
-            font-weight:bold;
-            color:#c77f00;
-            background: linear-gradient(90deg, #fff6d0 0%, #ffeccd 100%);
-            border-radius: 16px;
-            padding: 32px;
-            text-align:center;
-            box-shadow: 0 4px 24px rgba(255,140,0,0.07);'>
-            🕵️ UNDER REVIEW<br>
-            <span style='font-size:24px; color:#222; font-weight:normal;'>
-                Your claim is currently under review by our team.<br>
-                We will notify you with an update soon.<br>
-                Thank you for your patience.
-            </span>
-        </div>
-        """
-
+        st.markdown(verdict_block(final_decision), unsafe_allow_html=True)
         if final_decision.startswith("approve"):
-            st.markdown(approved_block, unsafe_allow_html=True)
             st.balloons()
-        elif final_decision.startswith("reject"):
-            st.markdown(rejected_block, unsafe_allow_html=True)
-        elif final_decision.startswith("flag"):
-            st.markdown(under_review_block, unsafe_allow_html=True)
-        else:
-            st.markdown(under_review_block, unsafe_allow_html=True)
 
 
         st.write("### Reason:")
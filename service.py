@@ -0,0 +1,210 @@
+import io
+import os
+import re
+import json
+import uuid
+import base64
+import signal
+import urllib.error
+import urllib.request
+from urllib.parse import urlparse, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from utils.ingest import ingest_upload, ingest_file, asset_path
+from utils.jobs import submit_job, get_job, list_jobs, job_counts, WorkerPool
+from utils.tracing import prometheus_text
+
+# Headless claim service: a small JSON-over-HTTP API in front of the job queue
+# in utils/jobs.py, plus the worker pool that drains it.
+#
+#   POST /jobs            claim payload -> 202 {"job_id": ...}
+#   GET  /jobs/<job_id>   job record: status, progress, result, trace, error
+#   GET  /jobs?status=    recent jobs, newest first
+#   GET  /healthz         queue depth and circuit breaker states
+#   GET  /metrics         Prometheus text
+#
+# A claim payload carries the image as one of
+#   "image" (base64) + "filename"  - uploaded bytes, ingested here
+#   "asset_id"                     - an object already in utils/ingest.py's store
+#   "file_path"                    - a file readable by the service; only accepted
+#                                    when CLAIM_SERVICE_FILE_PATHS=1
+# or several images as "assets": [{...one of the above, optional "exif"}, ...],
+# plus "user_text", "policy_data" {"policy_date", "dol", "threshold"} and
+# optionally "claim_id" (a new one per request when left out) and "exif".
+# Run it with `python cli.py serve`.
+
+SERVICE_URL = os.getenv("CLAIM_SERVICE_URL", "http://127.0.0.1:8502")
+MAX_BODY = 64 * 1024 * 1024
+# Reading arbitrary server paths is for trusted deployments (shared disk, backfills)
+ALLOW_FILE_PATHS = os.getenv("CLAIM_SERVICE_FILE_PATHS", "") == "1"
+
+
+def claim_state(payload, allow_file_paths=False):
+    """Ingest the payload's image and build the claim state for the graph."""
+    if not str(payload.get("user_text") or "").strip():
+        raise ValueError("user_text is required")
+
+    sources = payload.get("assets") or [payload]
+    if not isinstance(sources, list):
+        raise ValueError("assets must be a list")
+    uploads = [_ingest(source, allow_file_paths) for source in sources]
+
+    policy = payload.get("policy_data") or {}
+    state = {
+        # Not derived from the image: two claims with the same photo must not
+        # share a checkpoint thread, and the second must hit DUPLICATE_CHECK
+        "claim_id": payload.get("claim_id") or uuid.uuid4().hex,
+        "file_path": uploads[0]["path"],
+        "user_text": payload["user_text"],
+        "policy_data": {
+            "policy_date": policy.get("policy_date"),
+            "dol": policy.get("dol"),
+            "threshold": int(policy.get("threshold", 2)),
+        },
+    }
+    for key in ("exif", "use_llm_cache"):
+        if key in payload:
+            state[key] = payload[key]
+    if payload.get("assets"):
+        state["assets"] = [
+            {"file_path": upload["path"], "name": upload["name"], **({"exif": source["exif"]} if "exif" in source else {})}
+            for source, upload in zip(sources, uploads)
+        ]
+    return state
+
+def _ingest(source, allow_file_paths):
+    if source.get("image"):
+        data = base64.b64decode(source["image"], validate=True)
+        return ingest_upload(io.BytesIO(data), source.get("filename") or "upload")
+    if source.get("file_path"):
+        if not allow_file_paths:
+            raise ValueError("file_path is not accepted by this service; send image or asset_id")
+        if not os.path.isfile(source["file_path"]):
+            raise ValueError(f"file not found: {source['file_path']}")
+        return ingest_file(source["file_path"])
+    if source.get("asset_id"):
+        # Asset IDs are SHA-256 digests; anything else could name a path
+        if not re.fullmatch("[0-9a-f]{64}", str(source["asset_id"])):
+            raise ValueError(f"invalid asset_id: {source['asset_id']}")
+        path = asset_path(source["asset_id"])
+        if not os.path.isfile(path):
+            raise ValueError(f"unknown asset_id: {source['asset_id']}")
+        return {"upload_id": source["asset_id"], "path": path, "name": source.get("filename") or source["asset_id"]}
+    raise ValueError("one of image, file_path or asset_id is required")
+
+
+class ClaimHandler(BaseHTTPRequestHandler):
+    server_version = "ClaimService/1"
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == "/healthz":
+            from utils.resilience import breaker_states
+            return self._json(200, {"status": "ok", "jobs": job_counts(), "breakers": breaker_states()})
+        if url.path == "/metrics":
+            return self._send(200, prometheus_text().encode(), "text/plain; version=0.0.4")
+        if url.path == "/jobs":
+            query = parse_qs(url.query)
+            status = query.get("status", [None])[0]
+            try:
+                limit = int(query.get("limit", [50])[0])
+            except ValueError:
+                return self._json(400, {"error": "limit must be an integer"})
+            return self._json(200, {"jobs": list_jobs(status, limit)})
+        if url.path.startswith("/jobs/"):
+            job = get_job(url.path[len("/jobs/"):])
+            if job is None:
+                return self._json(404, {"error": "no such job"})
+            return self._json(200, job)
+        self._json(404, {"error": "not found"})
+
+    def do_POST(self):
+        if urlparse(self.path).path != "/jobs":
+            return self._json(404, {"error": "not found"})
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > MAX_BODY:
+            return self._json(413, {"error": f"body larger than {MAX_BODY} bytes"})
+        try:
+            payload = json.loads(self.rfile.read(length) or b"{}")
+            state = claim_state(payload, ALLOW_FILE_PATHS)
+        except (ValueError, TypeError, KeyError, AttributeError) as e:  # JSONDecodeError and binascii.Error are ValueErrors
+            return self._json(400, {"error": str(e)})
+        job_id = submit_job(state)
+        self._json(202, {"job_id": job_id, "claim_id": state["claim_id"]})
+
+    def _json(self, status, body):
+        self._send(status, json.dumps(body, default=str).encode(), "application/json")
+
+    def _send(self, status, data, content_type):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        if os.getenv("CLAIM_SERVICE_ACCESS_LOG"):
+            super().log_message(format, *args)
+
+
+def serve(host="127.0.0.1", port=8502, workers=4):
+    """Serve the API and run `workers` job threads until interrupted."""
+    stop_on_sigterm()
+    pool = WorkerPool(workers).start() if workers else None
+    server = ThreadingHTTPServer((host, port), ClaimHandler)
+    print(f"Claim service on http://{host}:{port} with {workers} worker(s)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if pool:
+            print("Waiting for running jobs to finish...")
+            pool.stop()
+
+
+def stop_on_sigterm():
+    # Containers stop with SIGTERM; treat it like Ctrl+C so running jobs finish
+    def interrupt(signum, frame):
+        raise KeyboardInterrupt
+    signal.signal(signal.SIGTERM, interrupt)
+
+
+# Client side, used by cli.py and the Streamlit UI
+class ServiceError(Exception):
+    pass
+
+def submit_claim(payload, url=None):
+    """POST a claim payload and return the job ID."""
+    return _request("POST", "/jobs", payload, url)["job_id"]
+
+def fetch_job(job_id, url=None):
+    return _request("GET", f"/jobs/{job_id}", None, url)
+
+def fetch_jobs(status=None, url=None):
+    return _request("GET", "/jobs" + (f"?status={status}" if status else ""), None, url)["jobs"]
+
+def image_payload(fileobj, filename):
+    """The "image"/"filename" part of a payload from a binary file object."""
+    if hasattr(fileobj, "seek"):
+        fileobj.seek(0)
+    return {"image": base64.b64encode(fileobj.read()).decode(), "filename": filename}
+
+def _request(method, path, body, url):
+    data = json.dumps(body).encode() if body is not None else None
+    request = urllib.request.Request(
+        (url or SERVICE_URL).rstrip("/") + path, data=data, method=method,
+        headers={"Content-Type": "application/json"},
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=30) as response:
+            return json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        try:
+            message = json.loads(e.read()).get("error", e.reason)
+        except ValueError:
+            message = e.reason
+        raise ServiceError(f"{e.code}: {message}") from None
+    except urllib.error.URLError as e:
+        raise ServiceError(f"claim service not reachable at {url or SERVICE_URL}: {e.reason}") from None
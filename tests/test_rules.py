@@ -0,0 +1,41 @@
+from utils.rules import evaluate_rules
+
+POLICY = {"policy_date": "2025-01-01", "dol": "2025-05-15", "threshold": 2}
+
+
+def rules_hit(state):
+    return [hit["rule"] for hit in evaluate_rules(state)["rule_hits"]]
+
+
+def test_screenshot_exif_without_capture_date_is_rejected():
+    # What a macOS screenshot PNG carries: image size and a comment, no DateTimeOriginal
+    state = {
+        "exif": {"ExifImageWidth": 1470, "ExifImageHeight": 956, "UserComment": "Screenshot"},
+        "exif_date": None,
+        "policy_data": POLICY,
+    }
+    update = evaluate_rules(state)
+    assert rules_hit(state) == ["missing_exif"]
+    assert update["final_decision"].startswith("REJECT:")
+
+
+def test_photo_with_capture_date_passes():
+    state = {
+        "exif": {"DateTimeOriginal": "2025:05:14 10:30:00"},
+        "exif_date": "2025-05-14 10:30:00",
+        "policy_data": POLICY,
+    }
+    assert evaluate_rules(state) == {"rule_hits": []}
+
+
+def test_exif_not_read_yet_does_not_fire():
+    assert rules_hit({"policy_data": POLICY}) == []
+
+
+def test_policy_starting_on_photo_day_is_rejected():
+    state = {
+        "exif": {"DateTimeOriginal": "2025:01:01 18:00:00"},
+        "exif_date": "2025-01-01 18:00:00",
+        "policy_data": POLICY,
+    }
+    assert rules_hit(state) == ["photo_before_policy"]
@@ -0,0 +1,96 @@
+import os
+import asyncio
+import sqlite3
+from datetime import datetime, timedelta, timezone
+
+# Durable LangGraph checkpoints for claim runs.
+#
+# process_claims and aprocess_claims (claim_agent.py) compile the graph with a
+# SQLite checkpointer and use the claim ID as the thread ID, so the state after
+# every node is on disk. A run that raised partway keeps the checkpoints of the
+# nodes that finished; running the same claim ID again resumes at the first
+# node that did not, and the Vision and LLM calls already paid for are not
+# repeated. `python cli.py stuck` lists such claims and `python cli.py replay`
+# resumes them.
+
+CHECKPOINT_DB = os.getenv("CLAIM_CHECKPOINT_DB", "data/checkpoints.sqlite")
+
+
+def make_saver():
+    """A SqliteSaver on CHECKPOINT_DB that serves both invoke() and ainvoke()."""
+    from langgraph.checkpoint.sqlite import SqliteSaver
+
+    class ThreadedSqliteSaver(SqliteSaver):
+        # The async methods run the sync ones on a worker thread. Checkpoint
+        # reads and writes take a few milliseconds, and unlike AsyncSqliteSaver
+        # the saver is not tied to one event loop.
+        async def aget_tuple(self, config):
+            return await asyncio.to_thread(self.get_tuple, config)
+
+        async def alist(self, config, *, filter=None, before=None, limit=None):
+            items = await asyncio.to_thread(
+                lambda: list(self.list(config, filter=filter, before=before, limit=limit))
+            )
+            for item in items:
+                yield item
+
+        async def aput(self, config, checkpoint, metadata, new_versions):
+            return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+        async def aput_writes(self, config, writes, task_id, task_path=""):
+            await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+        async def adelete_thread(self, thread_id):
+            await asyncio.to_thread(self.delete_thread, thread_id)
+
+    os.makedirs(os.path.dirname(CHECKPOINT_DB) or ".", exist_ok=True)
+    # SqliteSaver serializes access with its own lock
+    return ThreadedSqliteSaver(sqlite3.connect(CHECKPOINT_DB, check_same_thread=False, timeout=30))
+
+
+def thread_config(claim_id, **configurable):
+    return {"configurable": {"thread_id": str(claim_id), **configurable}}
+
+def thread_ids():
+    """Every claim ID with at least one checkpoint."""
+    if not os.path.exists(CHECKPOINT_DB):
+        return []
+    with sqlite3.connect(CHECKPOINT_DB, timeout=30) as db:
+        try:
+            return [row[0] for row in db.execute("SELECT DISTINCT thread_id FROM checkpoints")]
+        except sqlite3.OperationalError:
+            return []  # no run has created the tables yet
+
+
+def is_finished(snapshot):
+    return bool(snapshot.values) and not snapshot.next
+
+def is_stuck(snapshot):
+    """A run that stopped partway, or finished with a stage degraded."""
+    if not snapshot.values:
+        return False
+    return bool(snapshot.next) or bool(snapshot.values.get("degraded"))
+
+def describe(claim_id, snapshot):
+    errors = [f"{task.name}: {task.error!r}" for task in snapshot.tasks if task.error]
+    return {
+        "claim_id": claim_id,
+        "updated_at": snapshot.created_at,
+        "next": list(snapshot.next),
+        "degraded": [d["stage"] for d in snapshot.values.get("degraded") or []],
+        "error": "; ".join(errors) or None,
+    }
+
+
+def prune_finished(graph, older_than_days):
+    """Delete the checkpoints of finished claims last updated before the cutoff."""
+    cutoff = datetime.now(timezone.utc) - timedelta(days=older_than_days)
+    removed = 0
+    for claim_id in thread_ids():
+        snapshot = graph.get_state(thread_config(claim_id))
+        if is_stuck(snapshot) or not snapshot.created_at:
+            continue
+        if datetime.fromisoformat(snapshot.created_at) < cutoff:
+            graph.checkpointer.delete_thread(claim_id)
+            removed += 1
+    return removed
@@ -0,0 +1,158 @@
+from typing import TypedDict, Optional, Annotated
+
+from utils.clients import register, get_client
+from utils.llm_cache import cached_completion, acached_completion
+from utils.tracing import record_usage
+from utils.resilience import resilient_call, aresilient_call
+
+# One structured-output call that replaces summarize -> extract_key_info.
+# The model fills a typed schema (summary, label relevance, incident date,
+# items, amounts, cause), so downstream checks read fields instead of parsing
+# free text, and each claim makes one LLM round trip here instead of two.
+
+MODEL_NAME = "gemini-1.5-flash"
+MODEL_PARAMS = {"temperature": 0}
+SCHEMA_VERSION = "v1"  # bump when ClaimExtraction changes so cached results are not reused
+
+
+class ClaimedAmount(TypedDict):
+    """A monetary amount the claimant asks for or that appears on a document."""
+
+    amount: Annotated[float, ..., "Numeric amount without currency symbols"]
+    currency: Annotated[str, ..., "ISO 4217 code, e.g. USD; use USD if only '$' is shown"]
+    description: Annotated[str, ..., "What the amount is for"]
+
+
+class ClaimExtraction(TypedDict):
+    """Structured facts extracted from an insurance claim."""
+
+    summary: Annotated[str, ..., "Two or three sentence summary of the user's claim"]
+    label_relevance: Annotated[str, ..., "Whether the image labels and OCR text support or contradict the claim, and why"]
+    labels_support_claim: Annotated[bool, ..., "True if the image content supports the claimed damage"]
+    incident_date: Annotated[Optional[str], ..., "Date of the incident as YYYY-MM-DD, or null if not stated"]
+    damaged_items: Annotated[list[str], ..., "Damaged items or property"]
+    claimed_amounts: Annotated[list[ClaimedAmount], ..., "Amounts claimed or shown on bills; empty if none"]
+    cause_of_damage: Annotated[Optional[str], ..., "Cause of the damage, or null if not stated"]
+    supporting_documents: Annotated[list[str], ..., "Documents mentioned or shown, e.g. invoice, police report"]
+
+
+def _make_extractor():
+    from langchain_google_genai import ChatGoogleGenerativeAI
+
+    # Retries and timeouts are handled by utils/resilience.py
+    llm = ChatGoogleGenerativeAI(model=MODEL_NAME, max_retries=0, **MODEL_PARAMS)
+    # include_raw keeps the AIMessage so token usage can be recorded
+    return llm.with_structured_output(ClaimExtraction, include_raw=True)
+
+register("claim_extractor", _make_extractor)
+
+
+def build_prompt(claim_text: str) -> str:
+    return f"""
+You are an expert insurance assistant.
+
+Analyze the following claim and fill in every field of the schema.
+Only use facts present below; use null or an empty list when something is not stated.
+Write dates as YYYY-MM-DD; if the year is not stated, leave incident_date null.
+
+{claim_text}
+"""
+
+def extract_claim(claim_text: str, use_cache: bool = True) -> dict:
+    prompt = build_prompt(claim_text)
+
+    def call():
+        extractor = get_client("claim_extractor")
+        return _parsed(resilient_call("gemini", lambda: extractor.invoke(prompt)), prompt)
+
+    return cached_completion(MODEL_NAME, _cache_params(), prompt, call, use_cache=use_cache)
+
+async def aextract_claim(claim_text: str, use_cache: bool = True) -> dict:
+    prompt = build_prompt(claim_text)
+
+    async def call():
+        extractor = get_client("claim_extractor")
+        return _parsed(await aresilient_call("gemini", lambda: extractor.ainvoke(prompt)), prompt)
+
+    return await acached_completion(MODEL_NAME, _cache_params(), prompt, call, use_cache=use_cache)
+
+def _cache_params():
+    return {**MODEL_PARAMS, "schema": f"ClaimExtraction:{SCHEMA_VERSION}"}
+
+class SchemaMismatch(ValueError):
+    """The model answered, but not in the ClaimExtraction schema.
+
+    Carries `backend` and `reason` like resilience.BackendUnavailable, so
+    claim_agent records it as a degraded EXTRACT stage.
+    """
+
+    def __init__(self, reason):
+        super().__init__(f"Claim extraction did not match the schema: {reason}")
+        self.backend = "gemini"
+        self.reason = f"answer did not match the schema: {reason}"
+
+
+def _parsed(result, prompt):
+    raw = result.get("raw")
+    record_usage(MODEL_NAME, raw, prompt, str(getattr(raw, "content", "") or ""))
+    if result.get("parsing_error") or not result.get("parsed"):
+        # Raising keeps a malformed answer out of the cache
+        raise SchemaMismatch(result.get("parsing_error"))
+    return _with_defaults(result["parsed"])
+
+def _with_defaults(parsed):
+    return {
+        "summary": parsed.get("summary") or "",
+        "label_relevance": parsed.get("label_relevance") or "",
+        "labels_support_claim": bool(parsed.get("labels_support_claim")),
+        "incident_date": parsed.get("incident_date") or None,
+        "damaged_items": list(parsed.get("damaged_items") or []),
+        "claimed_amounts": [_amount(a) for a in parsed.get("claimed_amounts") or [] if isinstance(a, dict)],
+        "cause_of_damage": parsed.get("cause_of_damage") or None,
+        "supporting_documents": list(parsed.get("supporting_documents") or []),
+    }
+
+
+def _amount(item):
+    # The schema asks for a number, but models send null, "1,200" or "$1200"
+    return {
+        "amount": _number(item.get("amount")),
+        "currency": str(item.get("currency") or ""),
+        "description": str(item.get("description") or ""),
+    }
+
+def _number(value):
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return float(str(value).replace(",", "").strip(" $€£"))
+    except (TypeError, ValueError):
+        return None
+
+
+# Text renderings for the UI and the PDF report, in the old free-text layout
+def format_summary(extraction: dict) -> str:
+    return (
+        f"- 📝 Summary: {extraction['summary']}\n"
+        f"- 🔍 Visual Label Relevance: {extraction['label_relevance']}"
+    )
+
+def format_key_info(extraction: dict) -> str:
+    amounts = ", ".join(_format_amount(a) for a in extraction["claimed_amounts"])
+    return "\n".join([
+        f"- Incident Date: {extraction['incident_date'] or 'Not stated'}",
+        f"- Damaged Items/Property: {', '.join(extraction['damaged_items']) or 'Not stated'}",
+        f"- Claimed Amounts: {amounts or 'Not stated'}",
+        f"- Cause of Damage: {extraction['cause_of_damage'] or 'Not stated'}",
+        f"- Supporting Documents: {', '.join(extraction['supporting_documents']) or 'None mentioned'}",
+    ])
+
+def _format_amount(item):
+    # Extractions cached before amounts were coerced may still hold strings or null
+    amount = _number(item.get("amount"))
+    text = " ".join(filter(None, [
+        f"{amount:,.2f}" if amount is not None else "Amount not stated", item.get("currency"),
+    ]))
+    return f"{text} ({item['description']})" if item.get("description") else text
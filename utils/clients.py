@@ -0,0 +1,71 @@
+import os
+import asyncio
+import threading
+import weakref
+
+# Long-lived API clients, created on first use and shared by every node.
+#
+# Modules register a zero-argument factory under a name and fetch the client
+# with get_client(name). Creation happens once per process under a lock; a
+# forked worker gets fresh clients because gRPC channels and HTTP pools must
+# not be shared across a fork. Async clients are bound to the event loop that
+# created them, so they are registered with per_loop=True and cached per loop.
+
+_factories = {}
+_clients = {}
+_loop_clients = weakref.WeakKeyDictionary()  # event loop -> {name: client}
+_lock = threading.Lock()
+_pid = os.getpid()
+
+
+def register(name, factory, per_loop=False):
+    """Register (or replace) the factory for a named client."""
+    with _lock:
+        _factories[name] = (factory, per_loop)
+        _clients.pop(name, None)
+        for clients in _loop_clients.values():
+            clients.pop(name, None)
+
+
+def get_client(name):
+    factory, per_loop = _factories[name]
+    if os.getpid() != _pid:
+        _after_fork()
+
+    if per_loop:
+        # Keyed on the loop object itself (weakly) so a new loop never reuses
+        # a client whose channel belongs to a closed one
+        loop = asyncio.get_running_loop()
+        with _lock:
+            clients = _loop_clients.setdefault(loop, {})
+            if name not in clients:
+                clients[name] = factory()
+            return clients[name]
+
+    client = _clients.get(name)
+    if client is not None:
+        return client
+    with _lock:
+        if name not in _clients:
+            _clients[name] = factory()
+        return _clients[name]
+
+
+def reset_clients():
+    """Drop every cached client; the next get_client() builds a new one."""
+    with _lock:
+        _clients.clear()
+        _loop_clients.clear()
+
+
+def _after_fork():
+    # The parent's lock may have been held mid-fork, so replace it rather than acquire it
+    global _lock, _loop_clients, _pid
+    _lock = threading.Lock()
+    _clients.clear()
+    _loop_clients = weakref.WeakKeyDictionary()
+    _pid = os.getpid()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork)
@@ -1,20 +1,11 @@
-from PIL import Image
-from PIL.ExifTags import TAGS
 from datetime import datetime
 
+from utils.exif_reader import read_exif, gps_coordinates
+
 def extract_exif_data(image_path):
-    try:
-        img = Image.open(image_path)
-        exif_data = img._getexif()
-        if not exif_data:
-            return None
-        extracted = {}
-        for tag_id, value in exif_data.items():
-            tag = TAGS.get(tag_id, tag_id)
-            extracted[tag] = value
-        return extracted
-    except Exception:
-        return None
+    # Only the metadata segment is read, so this is cheaper than hashing the
+    # file for a cache lookup and needs no caching of its own
+    return read_exif(image_path)
 
 def get_datetime_original(exif):
     try:
@@ -24,3 +15,6 @@ def get_datetime_original(exif):
 
 def has_gps_data(exif):
     return 'GPSInfo' in exif if exif else False
+
+def get_gps_coordinates(exif):
+    return gps_coordinates(exif)
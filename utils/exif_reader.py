@@ -0,0 +1,199 @@
+import struct
+
+from PIL.ExifTags import TAGS, GPSTAGS
+
+# Reads EXIF straight from the container without decoding any pixels. For a
+# JPEG only the segments before the image data are walked (the APP1 "Exif"
+# segment is usually within the first 64 KB); for a PNG only chunk headers are
+# read and the eXIf chunk body is loaded. Everything else is seeked over.
+
+EXIF_IFD_POINTER = 0x8769
+GPS_IFD_POINTER = 0x8825
+MAKER_NOTE = 0x927C
+
+# TIFF field type -> (struct code, size in bytes)
+_TYPES = {
+    1: ("B", 1),   # BYTE
+    2: ("s", 1),   # ASCII
+    3: ("H", 2),   # SHORT
+    4: ("L", 4),   # LONG
+    5: ("LL", 8),  # RATIONAL
+    6: ("b", 1),   # SBYTE
+    7: ("s", 1),   # UNDEFINED
+    8: ("h", 2),   # SSHORT
+    9: ("l", 4),   # SLONG
+    10: ("ll", 8), # SRATIONAL
+    11: ("f", 4),  # FLOAT
+    12: ("d", 8),  # DOUBLE
+}
+
+_PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+
+def read_exif(source):
+    """Return EXIF tags as {tag name: value}, or None when the image has none.
+
+    `source` is a path or a binary file object (e.g. a Streamlit upload); a
+    file object's position is restored afterwards. IFD0 and the Exif sub-IFD
+    are merged like PIL's _getexif(); "GPSInfo" holds the GPS sub-IFD keyed by
+    GPS tag name. Rationals become floats and UNDEFINED blobs become text.
+    """
+    try:
+        if isinstance(source, (str, bytes)) or hasattr(source, "__fspath__"):
+            with open(source, "rb") as f:
+                tiff = _find_tiff_block(f)
+        else:
+            pos = source.tell()
+            try:
+                source.seek(0)
+                tiff = _find_tiff_block(source)
+            finally:
+                source.seek(pos)
+        return _parse_tiff(tiff) if tiff else None
+    except (OSError, struct.error, ValueError):
+        return None
+
+
+def read_exif_summary(source):
+    """Parse EXIF once and return everything the UI and the EXIF node use."""
+    exif = read_exif(source)
+    gps = gps_coordinates(exif)
+    return {
+        "exif": exif,
+        "datetime_original": (exif or {}).get("DateTimeOriginal"),
+        "make": (exif or {}).get("Make"),
+        "model": (exif or {}).get("Model"),
+        "software": (exif or {}).get("Software"),
+        "gps": gps,
+    }
+
+
+def gps_coordinates(exif):
+    """Decimal (lat, lon) from the GPSInfo sub-IFD, or None if incomplete."""
+    gps = (exif or {}).get("GPSInfo") or {}
+    try:
+        lat = _dms_to_degrees(gps["GPSLatitude"], gps.get("GPSLatitudeRef", "N"))
+        lon = _dms_to_degrees(gps["GPSLongitude"], gps.get("GPSLongitudeRef", "E"))
+    except (KeyError, TypeError, ValueError):
+        return None
+    return (lat, lon)
+
+
+def _dms_to_degrees(dms, ref):
+    degrees, minutes, seconds = (float(v) for v in dms)
+    value = degrees + minutes / 60 + seconds / 3600
+    return -value if str(ref).upper() in ("S", "W") else value
+
+
+# Container parsing
+def _find_tiff_block(f):
+    head = f.read(8)
+    if head[:2] == b"\xff\xd8":
+        f.seek(2)
+        return _jpeg_exif(f)
+    if head == _PNG_SIGNATURE:
+        return _png_exif(f)
+    return None
+
+def _jpeg_exif(f):
+    while True:
+        byte = f.read(1)
+        if not byte:
+            return None
+        if byte != b"\xff":
+            continue
+        marker = f.read(1)
+        while marker == b"\xff":  # fill bytes
+            marker = f.read(1)
+        if not marker:
+            return None
+        code = marker[0]
+        if code == 0xD8 or code == 0x01 or 0xD0 <= code <= 0xD7:
+            continue  # markers without a length field
+        if code in (0xDA, 0xD9):
+            return None  # start of scan / end of image: no EXIF before pixel data
+        (length,) = struct.unpack(">H", f.read(2))
+        if code == 0xE1:
+            payload = f.read(length - 2)
+            if payload.startswith(b"Exif\x00\x00"):
+                return payload[6:]
+        else:
+            f.seek(length - 2, 1)
+
+def _png_exif(f):
+    while True:
+        header = f.read(8)
+        if len(header) < 8:
+            return None
+        length, chunk_type = struct.unpack(">I4s", header)
+        if chunk_type == b"eXIf":
+            return f.read(length)
+        if chunk_type == b"IEND":
+            return None
+        f.seek(length + 4, 1)  # chunk data + CRC
+
+
+# TIFF / IFD parsing
+def _parse_tiff(tiff):
+    if tiff[:2] == b"II":
+        order = "<"
+    elif tiff[:2] == b"MM":
+        order = ">"
+    else:
+        return None
+    magic, ifd0 = struct.unpack(order + "HL", tiff[2:8])
+    if magic != 42:
+        return None
+
+    seen = set()
+    raw = _read_ifd(tiff, ifd0, order, seen)
+    exif_offset = raw.pop(EXIF_IFD_POINTER, None)
+    gps_offset = raw.pop(GPS_IFD_POINTER, None)
+    if isinstance(exif_offset, int):
+        raw.update(_read_ifd(tiff, exif_offset, order, seen))
+
+    tags = {TAGS.get(tag, tag): value for tag, value in raw.items()}
+    if isinstance(gps_offset, int):
+        gps = _read_ifd(tiff, gps_offset, order, seen)
+        tags["GPSInfo"] = {GPSTAGS.get(tag, tag): value for tag, value in gps.items()}
+    return tags or None
+
+def _read_ifd(tiff, offset, order, seen):
+    if offset in seen or offset + 2 > len(tiff):
+        return {}
+    seen.add(offset)
+
+    (count,) = struct.unpack_from(order + "H", tiff, offset)
+    entries = {}
+    for i in range(count):
+        entry = offset + 2 + i * 12
+        if entry + 12 > len(tiff):
+            break
+        tag, field_type, n = struct.unpack_from(order + "HHL", tiff, entry)
+        if tag == MAKER_NOTE or field_type not in _TYPES:
+            continue
+        code, size = _TYPES[field_type]
+        total = size * n
+        data_at = entry + 8
+        if total > 4:
+            (data_at,) = struct.unpack_from(order + "L", tiff, entry + 8)
+        if data_at + total > len(tiff):
+            continue
+        entries[tag] = _decode(tiff[data_at:data_at + total], field_type, code, n, order)
+    return entries
+
+def _decode(data, field_type, code, n, order):
+    if field_type == 2:
+        return data.split(b"\x00", 1)[0].decode("utf-8", "replace").strip()
+    if field_type == 7:
+        text = data.rstrip(b"\x00")
+        if all(32 <= b < 127 for b in text):
+            return text.decode("ascii")
+        return data.hex()
+
+    values = struct.unpack(order + code * n, data)
+    if field_type in (5, 10):
+        values = tuple(
+            num / den if den else 0.0 for num, den in zip(values[::2], values[1::2])
+        )
+    return values[0] if len(values) == 1 else values
@@ -0,0 +1,199 @@
+import os
+import time
+import sqlite3
+import threading
+
+import numpy as np
+from PIL import Image, ImageOps
+
+from utils.clients import register, get_client
+from utils.result_cache import cached_by_image
+
+# Near-duplicate detection for uploaded images.
+#
+# Every image gets two 64-bit perceptual hashes: a DCT-based pHash (robust to
+# resizing, recompression and small colour changes) and a gradient dHash used
+# to confirm pHash matches. Hashes are stored as plain 64-bit integers in
+# SQLite and searched with a BK-tree on pHash Hamming distance, so a lookup
+# visits a small fraction of the history instead of comparing every pair.
+
+HASH_DB = os.getenv("CLAIM_HASH_DB", "data/cache/image_hashes.sqlite")
+PHASH_RADIUS = int(os.getenv("DUPLICATE_PHASH_RADIUS", 8))
+DHASH_RADIUS = int(os.getenv("DUPLICATE_DHASH_RADIUS", 12))
+
+_DCT_SIZE = 32
+
+
+def _dct_matrix(n):
+    k = np.arange(n)[:, None]
+    i = np.arange(n)[None, :]
+    m = np.cos(np.pi * (2 * i + 1) * k / (2 * n)) * np.sqrt(2 / n)
+    m[0] /= np.sqrt(2)
+    return m
+
+_DCT = _dct_matrix(_DCT_SIZE)
+_BIT_WEIGHTS = (1 << np.arange(63, -1, -1, dtype=np.uint64)).astype(np.uint64)
+
+
+def _bits_to_int(bits):
+    return int(np.sum(bits.ravel().astype(np.uint64) * _BIT_WEIGHTS, dtype=np.uint64))
+
+def _load_gray(source):
+    with Image.open(source) as img:
+        if img.format in ("JPEG", "MPO"):
+            img.draft("L", (64, 64))  # decode at reduced scale; hashes only need a thumbnail
+        return ImageOps.exif_transpose(img).convert("L")
+
+def phash(gray) -> int:
+    small = gray.resize((_DCT_SIZE, _DCT_SIZE), Image.LANCZOS)
+    low = (_DCT @ np.asarray(small, dtype=np.float64) @ _DCT.T)[:8, :8]
+    # The DC term is overall brightness; leave it out of the median
+    return _bits_to_int(low > np.median(low.ravel()[1:]))
+
+def dhash(gray) -> int:
+    pixels = np.asarray(gray.resize((9, 8), Image.LANCZOS), dtype=np.int16)
+    return _bits_to_int(pixels[:, 1:] > pixels[:, :-1])
+
+def image_hashes(source):
+    """(pHash, dHash) of an image path or file object, decoding it once."""
+    gray = _load_gray(source)
+    return phash(gray), dhash(gray)
+
+@cached_by_image("image_hashes:v1")
+def file_hashes(image_path):
+    """image_hashes of a file, cached on its content."""
+    return image_hashes(image_path)
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+class BKTree:
+    """Metric tree over 64-bit hashes under Hamming distance."""
+
+    def __init__(self):
+        self.root = None  # [hash, items, {distance: child}]
+
+    def add(self, value, item):
+        if self.root is None:
+            self.root = [value, [item], {}]
+            return
+        node = self.root
+        while True:
+            d = hamming(value, node[0])
+            if d == 0:
+                node[1].append(item)
+                return
+            child = node[2].get(d)
+            if child is None:
+                node[2][d] = [value, [item], {}]
+                return
+            node = child
+
+    def search(self, value, radius):
+        """(distance, item) pairs within `radius`, nearest first."""
+        found, stack = [], [self.root] if self.root else []
+        while stack:
+            node = stack.pop()
+            d = hamming(value, node[0])
+            if d <= radius:
+                found.extend((d, item) for item in node[1])
+            # Triangle inequality: only children at distance d±radius can match
+            for dist, child in node[2].items():
+                if d - radius <= dist <= d + radius:
+                    stack.append(child)
+        return sorted(found, key=lambda pair: pair[0])
+
+
+def _to_signed(h):
+    return h - (1 << 64) if h >= 1 << 63 else h
+
+def _to_unsigned(h):
+    return h + (1 << 64) if h < 0 else h
+
+
+class DuplicateIndex:
+    def __init__(self, path=HASH_DB):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS image_hashes (
+                id INTEGER PRIMARY KEY,
+                phash INTEGER NOT NULL,
+                dhash INTEGER NOT NULL,
+                claim_id TEXT,
+                file_path TEXT,
+                added_at REAL,
+                UNIQUE (claim_id, phash)
+            )"""
+        )
+        self._db.commit()
+        self._tree = BKTree()
+        self._last_id = 0
+        self._lock = threading.Lock()
+
+    def _sync(self):
+        # Pick up rows written by other workers since the last lookup
+        rows = self._db.execute(
+            "SELECT id, phash, dhash, claim_id, file_path FROM image_hashes WHERE id > ? ORDER BY id",
+            (self._last_id,),
+        ).fetchall()
+        for row_id, p, d, claim_id, file_path in rows:
+            self._tree.add(_to_unsigned(p), (_to_unsigned(d), claim_id, file_path))
+            self._last_id = row_id
+
+    def find(self, p, d, exclude_claim=None):
+        with self._lock:
+            self._sync()
+            matches = []
+            for distance, (other_d, claim_id, file_path) in self._tree.search(p, PHASH_RADIUS):
+                if claim_id == exclude_claim or hamming(d, other_d) > DHASH_RADIUS:
+                    continue
+                matches.append({"claim_id": claim_id, "file_path": file_path, "distance": distance})
+            return matches
+
+    def add(self, p, d, claim_id, file_path):
+        with self._lock:
+            self._db.execute(
+                # A retried claim re-registers the same image; keep one row
+                "INSERT OR IGNORE INTO image_hashes (phash, dhash, claim_id, file_path, added_at) VALUES (?, ?, ?, ?, ?)",
+                (_to_signed(p), _to_signed(d), claim_id, file_path, time.time()),
+            )
+            self._db.commit()
+            self._sync()
+
+
+register("duplicate_index", DuplicateIndex)
+
+
+def check_and_register(image_path, claim_id):
+    """Earlier submissions that look like this image, then remember this one.
+
+    Matches from the same claim_id (a retry of this claim) are ignored.
+    """
+    p, d = file_hashes(image_path)
+    index = get_client("duplicate_index")
+    matches = index.find(p, d, exclude_claim=claim_id)
+    index.add(p, d, claim_id, image_path)
+    return matches
+
+
+class BatchDuplicates:
+    """What check_and_register will return for a batch of claims, without registering anything.
+
+    Images are checked in the order the batch is given: against the index, and
+    against the images of other claims seen earlier in the batch, which will
+    have been registered by then if their claims run first.
+    """
+
+    def __init__(self):
+        self._tree = BKTree()
+
+    def matches(self, image_path, claim_id):
+        p, d = file_hashes(image_path)
+        matches = get_client("duplicate_index").find(p, d, exclude_claim=claim_id)
+        for distance, (other_d, other_claim, file_path) in self._tree.search(p, PHASH_RADIUS):
+            if other_claim != claim_id and hamming(d, other_d) <= DHASH_RADIUS:
+                matches.append({"claim_id": other_claim, "file_path": file_path, "distance": distance})
+        self._tree.add(p, (d, claim_id, image_path))
+        return matches
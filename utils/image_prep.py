@@ -0,0 +1,203 @@
+import os
+import math
+import time
+import shutil
+import tempfile
+import threading
+
+from PIL import Image, ImageOps
+
+from utils.result_cache import CACHE_DIR, file_sha256
+
+# Upload normalization, shared by every node that reads pixels.
+#
+# Each image is decoded once, and turned upright from its EXIF orientation.
+# JPEGs larger than twice the biggest variant are decoded at a reduced scale
+# (draft); smaller ones, including typical 12 MP phone photos at the default
+# OCR_MAX_SIDE, are decoded in full. Two variants are written next to the
+# image cache, named by the SHA-256 of the original:
+#   vision.jpg  RGB, long side capped at VISION_MAX_SIDE; label detection
+#               does not need more, and Vision latency follows payload size
+#   ocr.png     grayscale, long side capped at OCR_MAX_SIDE (about 300 DPI
+#               for a letter page), lossless so glyph edges survive
+# Existing variant files are the cache: a resubmitted image costs one hash.
+# Like the DiskCaches, the folder is capped: once the variants exceed
+# VARIANT_MAX_BYTES, the least recently used images' folders are removed
+# (down to 90% of the cap) when the next one is written. A folder used in the
+# last VARIANT_MIN_AGE seconds is never removed, so a claim in flight keeps
+# its files.
+
+VARIANT_DIR = os.path.join(CACHE_DIR, "variants")
+VARIANT_MAX_BYTES = int(os.getenv("CLAIM_VARIANT_MAX_BYTES", 512 * 1024 * 1024))
+VARIANT_MIN_AGE = 600
+VISION_MAX_SIDE = int(os.getenv("CLAIM_VISION_MAX_SIDE", 1600))
+VISION_QUALITY = int(os.getenv("CLAIM_VISION_JPEG_QUALITY", 85))
+OCR_MAX_SIDE = int(os.getenv("OCR_TARGET_LONG_SIDE", 3300))
+
+_ORIENTATION = 0x0112
+
+# Images being prepared right now, by digest: [lock, callers]. The batch label
+# prefetch and the claim's own PREPROCESS node often ask for the same image at
+# once; the second waits and finds the variants on disk instead of decoding
+# it again.
+_building = {}
+_building_lock = threading.Lock()
+
+
+def prepare_image(image_path):
+    """Return {"vision_path", "ocr_path"} for an image, building them if needed."""
+    digest = file_sha256(image_path)
+    with _building_lock:
+        entry = _building.setdefault(digest, [threading.Lock(), 0])
+        entry[1] += 1
+    try:
+        with entry[0]:
+            return _prepare(image_path, digest)
+    finally:
+        with _building_lock:
+            entry[1] -= 1
+            if not entry[1]:
+                del _building[digest]
+
+def _prepare(image_path, digest):
+    folder = os.path.join(VARIANT_DIR, digest)
+    vision_path = os.path.join(folder, "vision.jpg")
+    ocr_path = os.path.join(folder, "ocr.png")
+    # Small upright JPEGs and multi-page TIFFs are used as they are
+    original = os.path.join(folder, "original")
+    if os.path.exists(original):
+        with open(original) as f:
+            kinds = f.read().split()
+        _touch(folder)
+        return {
+            "vision_path": image_path if "vision" in kinds else vision_path,
+            "ocr_path": image_path if "ocr" in kinds else ocr_path,
+        }
+    if os.path.exists(vision_path) and os.path.exists(ocr_path):
+        _touch(folder)
+        return {"vision_path": vision_path, "ocr_path": ocr_path}
+
+    os.makedirs(folder, exist_ok=True)
+    use_original = []
+    with Image.open(image_path) as img:
+        fmt = img.format
+        multipage = fmt == "TIFF" and getattr(img, "n_frames", 1) > 1
+        upright = img.getexif().get(_ORIENTATION, 1) == 1
+        small = max(img.size) <= VISION_MAX_SIDE
+        if fmt in ("JPEG", "MPO"):
+            _draft(img, max(VISION_MAX_SIDE, OCR_MAX_SIDE))
+        img = ImageOps.exif_transpose(img)
+
+        if fmt == "JPEG" and upright and small:
+            use_original.append("vision")
+        else:
+            _write(vision_path, _flatten(_capped(img, VISION_MAX_SIDE)), "JPEG",
+                   quality=VISION_QUALITY, optimize=True)
+
+        if multipage:
+            use_original.append("ocr")  # OCR reads every page
+        else:
+            _write(ocr_path, _capped(img.convert("L"), OCR_MAX_SIDE), "PNG", compress_level=1)
+
+    if use_original:
+        _write_text(original, " ".join(use_original))
+    _account(digest, folder)
+    return {
+        "vision_path": image_path if "vision" in use_original else vision_path,
+        "ocr_path": image_path if "ocr" in use_original else ocr_path,
+    }
+
+
+# Size accounting
+# Folder sizes are remembered per process ({digest: bytes}, filled from disk
+# on first use); a folder's mtime is its last use. Folders written by other
+# workers are picked up whenever the cap is enforced.
+_sizes = None
+_sizes_lock = threading.Lock()
+
+def _touch(folder):
+    try:
+        os.utime(folder)
+    except OSError:
+        pass
+
+def _folder_size(folder):
+    try:
+        return sum(entry.stat().st_size for entry in os.scandir(folder) if entry.is_file())
+    except OSError:
+        return 0
+
+def _account(digest, folder):
+    global _sizes
+    with _sizes_lock:
+        if _sizes is None:
+            _sizes = {name: _folder_size(os.path.join(VARIANT_DIR, name)) for name in os.listdir(VARIANT_DIR)}
+        _sizes[digest] = _folder_size(folder)
+        if sum(_sizes.values()) > VARIANT_MAX_BYTES:
+            _evict(keep=digest)
+
+def _evict(keep):
+    used = {}
+    for entry in os.scandir(VARIANT_DIR):
+        try:
+            used[entry.name] = entry.stat().st_mtime
+        except OSError:
+            continue
+        if entry.name not in _sizes:
+            _sizes[entry.name] = _folder_size(entry.path)
+    for name in set(_sizes) - set(used):
+        del _sizes[name]  # removed by another worker
+
+    total, target = sum(_sizes.values()), VARIANT_MAX_BYTES * 0.9
+    cutoff = time.time() - VARIANT_MIN_AGE
+    for name in sorted(used, key=used.get):
+        if total <= target or used[name] > cutoff:
+            break
+        if name == keep:
+            continue
+        shutil.rmtree(os.path.join(VARIANT_DIR, name), ignore_errors=True)
+        total -= _sizes.pop(name)
+
+
+def _draft(img, long_side):
+    # draft() only shrinks by 1/2, 1/4 or 1/8, keeping both sides at least the
+    # requested box, so the box has the image's aspect and the long side the
+    # largest variant needs. A 12 MP photo with the default 3300 OCR cap
+    # decodes at full size; only images over twice the cap are reduced.
+    scale = long_side / max(img.size)
+    if scale < 1:
+        img.draft(img.mode, (math.ceil(img.width * scale), math.ceil(img.height * scale)))
+
+def _capped(img, max_side):
+    scale = max_side / max(img.size)
+    if scale >= 1:
+        return img
+    size = (max(1, round(img.width * scale)), max(1, round(img.height * scale)))
+    # reducing_gap lets Pillow shrink by an integer factor first, then resample
+    return img.resize(size, Image.LANCZOS, reducing_gap=3.0)
+
+def _flatten(img):
+    # Screenshots often carry alpha; JPEG has none, so composite onto white
+    if img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info):
+        img = img.convert("RGBA")
+        background = Image.new("RGB", img.size, "white")
+        background.paste(img, mask=img.getchannel("A"))
+        return background
+    return img.convert("RGB")
+
+# Write then rename so a concurrent reader never sees a partial variant
+def _write(path, img, fmt, **params):
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            img.save(f, fmt, **params)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+def _write_text(path, text):
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    with os.fdopen(fd, "w") as f:
+        f.write(text)
+    os.replace(tmp, path)
@@ -0,0 +1,125 @@
+import os
+import time
+import shutil
+import sqlite3
+import hashlib
+import tempfile
+import threading
+from datetime import datetime
+
+# Upload ingestion into a content-addressed store.
+#
+# Uploads are streamed to a temp file in fixed-size chunks while being hashed,
+# so memory per upload stays at one chunk. The finished file is hard-linked
+# into objects/<aa>/<bb>/<sha256>; if that object already exists the temp file
+# is dropped, so resubmitting the same photo costs no extra storage. Every
+# upload still gets its own row in uploads.sqlite pointing at the shared
+# object, and the object's hash is the stable asset ID used downstream.
+
+ASSET_DIR = os.getenv("CLAIM_ASSET_DIR", "data/assets")
+CHUNK_SIZE = 1024 * 1024
+
+_db = None
+_db_lock = threading.Lock()
+
+
+def ingest_upload(fileobj, filename):
+    """Store a binary file object (e.g. a Streamlit upload) and describe it.
+
+    Returns {"asset_id", "upload_id", "path", "name", "size", "deduplicated"}.
+    """
+    if hasattr(fileobj, "seek"):
+        fileobj.seek(0)
+
+    tmp_dir = os.path.join(ASSET_DIR, "tmp")
+    os.makedirs(tmp_dir, exist_ok=True)
+    digest, size = hashlib.sha256(), 0
+    with tempfile.NamedTemporaryFile(dir=tmp_dir, delete=False) as tmp:
+        for chunk in iter(lambda: fileobj.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+            tmp.write(chunk)
+            size += len(chunk)
+
+    asset_id = digest.hexdigest()
+    path = asset_path(asset_id)
+    deduplicated = _publish(tmp.name, path)
+
+    upload_id = datetime.now().strftime("%Y%m%d%H%M%S%f")
+    _record_upload(upload_id, asset_id, filename, size)
+    return {
+        "asset_id": asset_id,
+        "upload_id": upload_id,
+        "path": path,
+        "name": filename,
+        "size": size,
+        "deduplicated": deduplicated,
+    }
+
+def ingest_file(path, filename=None):
+    """Ingest a file already on disk (CLI and backfill jobs)."""
+    with open(path, "rb") as f:
+        return ingest_upload(f, filename or os.path.basename(path))
+
+def asset_path(asset_id):
+    return os.path.join(ASSET_DIR, "objects", asset_id[:2], asset_id[2:4], asset_id)
+
+def uploads_for(asset_id):
+    """Every upload that resolved to this asset, oldest first."""
+    rows = _uploads_db().execute(
+        "SELECT upload_id, name, size, uploaded_at FROM uploads WHERE asset_id = ? ORDER BY uploaded_at",
+        (asset_id,),
+    ).fetchall()
+    return [dict(zip(("upload_id", "name", "size", "uploaded_at"), row)) for row in rows]
+
+
+def _publish(tmp_path, path):
+    """Move the temp file to its object path; True if the object already existed."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    try:
+        # link() fails if the object exists, which makes concurrent ingests of
+        # the same bytes safe without a lock
+        os.link(tmp_path, path)
+        deduplicated = False
+    except FileExistsError:
+        deduplicated = True
+    except OSError:
+        # Filesystem without hard links
+        if os.path.exists(path):
+            deduplicated = True
+        else:
+            shutil.copyfile(tmp_path, path)
+            deduplicated = False
+    os.unlink(tmp_path)
+    if not deduplicated:
+        os.chmod(path, 0o444)  # objects are shared by every upload of these bytes
+    return deduplicated
+
+def _uploads_db():
+    global _db
+    with _db_lock:
+        if _db is None:
+            os.makedirs(ASSET_DIR, exist_ok=True)
+            _db = sqlite3.connect(
+                os.path.join(ASSET_DIR, "uploads.sqlite"), check_same_thread=False, timeout=30
+            )
+            _db.execute(
+                """CREATE TABLE IF NOT EXISTS uploads (
+                    upload_id TEXT PRIMARY KEY,
+                    asset_id TEXT NOT NULL,
+                    name TEXT,
+                    size INTEGER,
+                    uploaded_at REAL
+                )"""
+            )
+            _db.execute("CREATE INDEX IF NOT EXISTS uploads_asset ON uploads(asset_id)")
+            _db.commit()
+        return _db
+
+def _record_upload(upload_id, asset_id, name, size):
+    db = _uploads_db()
+    with _db_lock:
+        db.execute(
+            "INSERT OR REPLACE INTO uploads (upload_id, asset_id, name, size, uploaded_at) VALUES (?, ?, ?, ?, ?)",
+            (upload_id, asset_id, name, size, time.time()),
+        )
+        db.commit()
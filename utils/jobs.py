@@ -0,0 +1,245 @@
+import os
+import json
+import time
+import uuid
+import logging
+import sqlite3
+import threading
+
+from utils.tracing import trace_record, metrics
+
+log = logging.getLogger(__name__)
+
+# Durable claim job queue, shared by service.py, cli.py and the Streamlit UI.
+#
+# A job is one claim state (the same dict claim_agent takes) stored as JSON in
+# jobs.sqlite. Workers lease the oldest queued job, run the graph and write the
+# final state and its trace back. A lease that is not finished in LEASE_SECONDS
+# (the worker died) makes the job available again, up to MAX_ATTEMPTS runs.
+# Several service processes can share one database: leasing happens inside an
+# IMMEDIATE transaction, so two workers never take the same job, nor two jobs
+# of the same claim. Runs are checkpointed under the claim ID, so a job run
+# again after a crash resumes its claim rather than starting over. While a job runs, its `progress` holds
+# the nodes finished so far and the final decision as it is being generated,
+# so a poller can show the verdict before the explanation is complete.
+
+JOB_DB = os.getenv("CLAIM_JOB_DB", "data/jobs.sqlite")
+LEASE_SECONDS = float(os.getenv("CLAIM_JOB_LEASE", 900))
+MAX_ATTEMPTS = int(os.getenv("CLAIM_JOB_ATTEMPTS", 3))
+PROGRESS_INTERVAL = 0.25  # seconds between progress writes while the decision streams
+
+STATUSES = ("queued", "running", "done", "failed")
+_COLUMNS = ("job_id", "claim_id", "status", "payload", "result", "trace", "error",
+            "attempts", "created_at", "started_at", "finished_at", "progress")
+
+_db = None
+_db_lock = threading.Lock()
+_wakeup = threading.Event()  # set on submit so local workers don't wait out a poll
+
+
+def submit_job(state):
+    """Queue a claim state and return its job ID."""
+    job_id = uuid.uuid4().hex
+    db = _jobs_db()
+    with _db_lock:
+        db.execute(
+            "INSERT INTO jobs (job_id, claim_id, status, payload, attempts, created_at) VALUES (?, ?, 'queued', ?, 0, ?)",
+            (job_id, state.get("claim_id"), json.dumps(state, default=str), time.time()),
+        )
+    metrics.inc("claim_jobs_total", {"status": "queued"})
+    _wakeup.set()
+    return job_id
+
+def get_job(job_id):
+    """The job as a dict with payload/result/trace decoded, or None."""
+    db = _jobs_db()
+    with _db_lock:
+        row = db.execute(f"SELECT {', '.join(_COLUMNS)} FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+    return _decode(row) if row else None
+
+def list_jobs(status=None, limit=50):
+    """Newest first, without payloads or results."""
+    query = "SELECT job_id, claim_id, status, error, attempts, created_at, started_at, finished_at FROM jobs"
+    params = ()
+    if status:
+        query += " WHERE status = ?"
+        params = (status,)
+    query += " ORDER BY created_at DESC LIMIT ?"
+    db = _jobs_db()
+    with _db_lock:
+        rows = db.execute(query, params + (limit,)).fetchall()
+    keys = ("job_id", "claim_id", "status", "error", "attempts", "created_at", "started_at", "finished_at")
+    return [dict(zip(keys, row)) for row in rows]
+
+def job_counts():
+    db = _jobs_db()
+    with _db_lock:
+        rows = db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+    return {status: 0 for status in STATUSES} | dict(rows)
+
+
+def lease_job():
+    """Take the oldest runnable job: (job_id, state), or None if the queue is empty."""
+    now = time.time()
+    db = _jobs_db()
+    with _db_lock:
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            # Expired leases that have used up their attempts are failed, not rerun
+            db.execute(
+                "UPDATE jobs SET status = 'failed', error = 'worker lease expired', finished_at = ? "
+                "WHERE status = 'running' AND leased_until < ? AND attempts >= ?",
+                (now, now, MAX_ATTEMPTS),
+            )
+            # One run per claim at a time: a claim resubmitted while its
+            # earlier job still runs waits, since both use one checkpoint thread
+            row = db.execute(
+                "SELECT job_id, payload FROM jobs AS j "
+                "WHERE (status = 'queued' OR (status = 'running' AND leased_until < ?)) "
+                "AND (claim_id IS NULL OR NOT EXISTS (SELECT 1 FROM jobs AS other "
+                "WHERE other.claim_id = j.claim_id AND other.job_id != j.job_id "
+                "AND other.status = 'running' AND other.leased_until >= ?)) "
+                "ORDER BY created_at LIMIT 1",
+                (now, now),
+            ).fetchone()
+            if row:
+                db.execute(
+                    "UPDATE jobs SET status = 'running', attempts = attempts + 1, "
+                    "started_at = ?, leased_until = ? WHERE job_id = ?",
+                    (now, now + LEASE_SECONDS, row[0]),
+                )
+            db.commit()
+        except BaseException:
+            db.rollback()
+            raise
+    return (row[0], json.loads(row[1])) if row else None
+
+def finish_job(job_id, result=None, trace=None, error=None):
+    status = "failed" if error else "done"
+    db = _jobs_db()
+    with _db_lock:
+        db.execute(
+            "UPDATE jobs SET status = ?, result = ?, trace = ?, error = ?, finished_at = ?, leased_until = NULL "
+            "WHERE job_id = ?",
+            (status, _dumps(result), _dumps(trace), error, time.time(), job_id),
+        )
+    metrics.inc("claim_jobs_total", {"status": status})
+
+def set_progress(job_id, progress):
+    db = _jobs_db()
+    with _db_lock:
+        db.execute("UPDATE jobs SET progress = ? WHERE job_id = ?", (_dumps(progress), job_id))
+
+def run_job(job_id, state):
+    """Run one leased job through the claim graph and record the outcome."""
+    from claim_agent import stream_claim
+
+    progress = {"nodes": [], "final_decision": None}
+    written = 0.0
+    try:
+        for event, value in stream_claim(state):
+            if event == "done":
+                result = value
+                continue
+            if event == "node":
+                progress["nodes"].append(value)
+            else:
+                # The verdict line is written as soon as it is complete
+                first_line = "\n" in value and "\n" not in (progress["final_decision"] or "")
+                progress["final_decision"] = value
+                if not first_line and time.monotonic() - written < PROGRESS_INTERVAL:
+                    continue
+            set_progress(job_id, progress)
+            written = time.monotonic()
+    except Exception as e:
+        finish_job(job_id, error=repr(e))
+        return
+    record_result(job_id, result)
+
+def record_result(job_id, result):
+    finish_job(job_id, result={k: v for k, v in result.items() if k != "trace"}, trace=trace_record(result))
+
+def jobs_for_claim(claim_id):
+    db = _jobs_db()
+    with _db_lock:
+        return [row[0] for row in db.execute("SELECT job_id FROM jobs WHERE claim_id = ?", (claim_id,))]
+
+
+class WorkerPool:
+    """Threads that lease and run jobs until stop() is called."""
+
+    def __init__(self, workers=4, poll_interval=1.0):
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self._stop = threading.Event()
+        self._threads = []
+
+    def start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"claim-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def stop(self, timeout=None):
+        """Stop leasing new jobs and wait for running ones to finish."""
+        self._stop.set()
+        _wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                job = lease_job()
+            except sqlite3.OperationalError as e:
+                log.warning("Could not lease a job: %s", e)  # e.g. database locked by another process
+                job = None
+            if job is None:
+                _wakeup.wait(self.poll_interval)
+                _wakeup.clear()
+                continue
+            run_job(*job)
+
+
+def _jobs_db():
+    global _db
+    with _db_lock:
+        if _db is None:
+            os.makedirs(os.path.dirname(JOB_DB) or ".", exist_ok=True)
+            # Autocommit mode so lease_job controls its own transaction
+            _db = sqlite3.connect(JOB_DB, check_same_thread=False, timeout=30, isolation_level=None)
+            _db.execute("PRAGMA journal_mode=WAL")
+            _db.execute(
+                """CREATE TABLE IF NOT EXISTS jobs (
+                    job_id TEXT PRIMARY KEY,
+                    claim_id TEXT,
+                    status TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    result TEXT,
+                    trace TEXT,
+                    error TEXT,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    created_at REAL,
+                    started_at REAL,
+                    finished_at REAL,
+                    leased_until REAL,
+                    progress TEXT
+                )"""
+            )
+            # Databases created before progress was recorded
+            if "progress" not in {row[1] for row in _db.execute("PRAGMA table_info(jobs)")}:
+                _db.execute("ALTER TABLE jobs ADD COLUMN progress TEXT")
+            _db.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs(status, created_at)")
+            _db.execute("CREATE INDEX IF NOT EXISTS jobs_claim ON jobs(claim_id, status)")
+        return _db
+
+def _dumps(value):
+    return None if value is None else json.dumps(value, default=str)
+
+def _decode(row):
+    job = dict(zip(_COLUMNS, row))
+    for key in ("payload", "result", "trace", "progress"):
+        if job[key] is not None:
+            job[key] = json.loads(job[key])
+    return job
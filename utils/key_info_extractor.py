@@ -1,8 +1,12 @@
-from langchain.prompts import PromptTemplate
-from langchain_openai import ChatOpenAI
-from langchain.chains import LLMChain
+from utils.clients import register, get_client
+from utils.llm_cache import cached_completion, acached_completion
+from utils.tracing import record_usage
+from utils.resilience import resilient_call, aresilient_call
 
-prompt = PromptTemplate.from_template("""
+MODEL_NAME = "gpt-3.5-turbo"
+MODEL_PARAMS = {"temperature": 0}
+
+PROMPT_TEMPLATE = """
 Extract key claim information from the following text:
 {text}
 
@@ -12,10 +16,39 @@ Return:
 - Claimed Amounts (if stated)
 - Cause of Damage
 - Supporting Documents (if mentioned)
-""")
+"""
+
+# LangChain and the OpenAI SDK are imported when the chain is first needed
+def _make_chain():
+    from langchain.prompts import PromptTemplate
+    from langchain_openai import ChatOpenAI
+    from langchain.chains import LLMChain
+
+    prompt = PromptTemplate.from_template(PROMPT_TEMPLATE)
+    # Retries and timeouts are handled by utils/resilience.py
+    return LLMChain(llm=ChatOpenAI(model=MODEL_NAME, max_retries=0, **MODEL_PARAMS), prompt=prompt)
+
+register("key_info_chain", _make_chain)
+
+# LLMChain.run returns only the text, so token counts are estimated
+def extract_key_info(text, use_cache=True):
+    prompt = PROMPT_TEMPLATE.format(text=text)
+
+    def call():
+        chain = get_client("key_info_chain")
+        result = resilient_call("openai", lambda: chain.run(text))
+        record_usage(MODEL_NAME, None, prompt, result)
+        return result.strip()
+
+    return cached_completion(MODEL_NAME, MODEL_PARAMS, prompt, call, use_cache=use_cache)
+
+async def aextract_key_info(text, use_cache=True):
+    prompt = PROMPT_TEMPLATE.format(text=text)
+
+    async def call():
+        chain = get_client("key_info_chain")
+        result = await aresilient_call("openai", lambda: chain.arun(text))
+        record_usage(MODEL_NAME, None, prompt, result)
+        return result.strip()
 
-def extract_key_info(text):
-    llm = ChatOpenAI(temperature=0, model="gpt-3.5-turbo")
-    chain = LLMChain(llm=llm, prompt=prompt)
-    result = chain.run(text)
-    return result.strip()
+    return await acached_completion(MODEL_NAME, MODEL_PARAMS, prompt, call, use_cache=use_cache)
@@ -0,0 +1,145 @@
+import os
+import json
+import hashlib
+import asyncio
+import threading
+from collections import OrderedDict
+
+from utils.result_cache import CACHE_DIR, DiskCache
+from utils.tracing import external_call, record_cache
+
+# Responses are reused until they age out; prompts change whenever the claim does
+LLM_CACHE_TTL = 7 * 24 * 3600
+
+
+class MemoryCache:
+    """In-process LRU tier with the same get/set interface as DiskCache."""
+
+    def __init__(self, max_entries=512):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._data:
+                self.misses += 1
+                return False, None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return True, self._data[key]
+
+    def set(self, key, value, ttl=None):
+        # TTLs are enforced by the persistent tier; the LRU bound keeps this one fresh
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": len(self._data),
+        }
+
+
+class TieredCache:
+    """Checks each tier in order and back-fills the faster tiers on a hit."""
+
+    def __init__(self, *tiers):
+        self.tiers = list(tiers)
+
+    def get(self, key):
+        for i, tier in enumerate(self.tiers):
+            hit, value = tier.get(key)
+            if hit:
+                for faster in self.tiers[:i]:
+                    faster.set(key, value)
+                return True, value
+        return False, None
+
+    def set(self, key, value, ttl=None):
+        for tier in self.tiers:
+            tier.set(key, value, ttl)
+
+    def clear(self):
+        for tier in self.tiers:
+            tier.clear()
+
+    def stats(self) -> dict:
+        return {type(tier).__name__: tier.stats() for tier in self.tiers}
+
+
+_cache = TieredCache(
+    MemoryCache(max_entries=int(os.getenv("CLAIM_LLM_CACHE_ENTRIES", 512))),
+    DiskCache(os.path.join(CACHE_DIR, "llm_responses.sqlite")),
+)
+
+def get_llm_cache():
+    return _cache
+
+def set_llm_cache(cache):
+    """Swap in any object with get(key) -> (hit, value) and set(key, value, ttl)."""
+    global _cache
+    _cache = cache
+
+def llm_cache_stats() -> dict:
+    return _cache.stats()
+
+
+def normalize_prompt(prompt: str) -> str:
+    # Indentation and trailing spaces in the templates don't change the answer
+    return "\n".join(" ".join(line.split()) for line in prompt.strip().splitlines())
+
+def make_key(model: str, params: dict, prompt: str) -> str:
+    payload = json.dumps(
+        {"model": model, "params": params, "prompt": normalize_prompt(prompt)},
+        sort_keys=True,
+        default=str,
+    )
+    return "llm:" + hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def cached_completion(model, params, prompt, call, use_cache=True, ttl=LLM_CACHE_TTL):
+    """Return call() for this (model, params, prompt), reusing a cached response.
+
+    `call` takes no arguments and returns the response text. Pass
+    use_cache=False to force a fresh call; the new response still replaces
+    the cached one.
+    """
+    key = make_key(model, params, prompt)
+    if use_cache:
+        hit, value = _cache.get(key)
+        record_cache("llm", hit)
+        if hit:
+            return value
+    with external_call(model.split("/")[-1]):
+        value = call()
+    _cache.set(key, value, ttl)
+    return value
+
+async def acached_completion(model, params, prompt, acall, use_cache=True, ttl=LLM_CACHE_TTL):
+    """Async counterpart of cached_completion; `acall` returns an awaitable."""
+    key = make_key(model, params, prompt)
+    if use_cache:
+        hit, value = await asyncio.to_thread(_cache.get, key)
+        record_cache("llm", hit)
+        if hit:
+            return value
+    with external_call(model.split("/")[-1]):
+        value = await acall()
+    await asyncio.to_thread(_cache.set, key, value, ttl)
+    return value
@@ -1,35 +1,48 @@
+from datetime import date, datetime
+
+
 def detect_misrepresentation(key_info, policy_data):
-    try:
-        incident_date = key_info.get("Incident Date")
-        dol = policy_data["dol"]
-        policy_date = policy_data["policy_date"]
+    """Compare the extracted incident date with the policy dates.
 
-        dol_dt = dol
-        pol_dt = policy_date
+    `key_info` is the structured extraction (see utils/claim_extractor.py);
+    its "incident_date" is ISO YYYY-MM-DD. Older free-text dates like
+    "May 15" are still accepted and take the year of the DOL.
+    """
+    incident_date = (key_info or {}).get("incident_date") or (key_info or {}).get("Incident Date")
+    dol = _to_date(policy_data.get("dol"))
+    policy_date = _to_date(policy_data.get("policy_date"))
+    threshold = int(policy_data.get("threshold", 0))
 
-        misrep_flag = False
-        reason = ""
+    incident = _to_date(incident_date, default_year=dol.year if dol else None)
+    reasons = []
+    if incident and policy_date and incident < policy_date:
+        reasons.append(f"Incident date {incident} is before policy inception ({policy_date}).")
+    if incident and dol and abs((incident - dol).days) > threshold:
+        reasons.append(f"Incident date {incident} does not match the reported Date of Loss ({dol}).")
 
-        if incident_date:
-            from datetime import datetime
-            try:
-                incident_dt = datetime.strptime(incident_date, "%B %d")
-                incident_dt = incident_dt.replace(year=pol_dt.year)
-                if incident_dt < pol_dt:
-                    misrep_flag = True
-                    reason = "Incident occurred before policy inception."
-                elif incident_dt != dol_dt:
-                    misrep_flag = True
-                    reason = "Date of Loss and incident date mismatch."
-            except:
-                pass
+    return {
+        "misrepresentation_found": "Yes" if reasons else "No",
+        "reason": " ".join(reasons),
+        "incident_date": incident.isoformat() if incident else None,
+    }
 
-        return {
-            "misrepresentation_found": "Yes" if misrep_flag else "No",
-            "reason": reason
-        }
-    except:
-        return {
-            "misrepresentation_found": "No",
-            "reason": ""
-        }
+
+def _to_date(value, default_year=None):
+    if value is None or value == "":
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    text = str(value).strip()
+    try:
+        return datetime.fromisoformat(text.split("T")[0]).date()
+    except ValueError:
+        pass
+    if default_year:
+        for fmt in ("%B %d", "%b %d", "%d %B", "%d %b"):
+            try:
+                return datetime.strptime(text, fmt).date().replace(year=default_year)
+            except ValueError:
+                continue
+    return None
@@ -0,0 +1,101 @@
+import os
+import json
+import asyncio
+import hashlib
+import functools
+
+from utils.result_cache import CACHE_DIR, DiskCache, file_sha256
+from utils.tracing import record_cache
+
+# Incremental re-evaluation of claims.
+#
+# Graph nodes worth skipping declare the ClaimState keys they read (NODE_READS
+# in claim_agent.py). Before such a node runs, those inputs are fingerprinted
+# and, if the node already ran on the same inputs, its stored update is
+# returned instead. Re-running a claim with a new policy date, DOL or
+# threshold re-executes only the nodes that read them (EXIF, the local checks
+# and FINAL_DECISION); Vision, OCR, the extraction call and the similar-claims
+# lookup come back from here.
+#
+# A read is a state key, or "key.field" for one field of a dict or of every
+# item in a list ("assets.file_path"). File paths are fingerprinted by content.
+# Updates that record a degraded stage are not stored, so when the claim runs
+# again (claim_agent reruns finished claims that degraded) the backend is
+# retried. Claims with use_llm_cache=False run every node.
+
+NODE_CACHE_VERSION = 1  # bump when a node's update changes shape
+NODE_CACHE_TTL = float(os.getenv("CLAIM_NODE_CACHE_TTL", 7 * 24 * 3600))
+
+node_cache = DiskCache(
+    os.path.join(CACHE_DIR, "node_outputs.sqlite"),
+    max_bytes=int(os.getenv("CLAIM_NODE_CACHE_MAX_BYTES", 64 * 1024 * 1024)),
+)
+
+
+def fingerprint(name, reads, state):
+    """Cache key for node `name` over the parts of `state` it reads."""
+    inputs = {read: _read(state, read) for read in reads}
+    blob = json.dumps([name, NODE_CACHE_VERSION, _plain(inputs)], sort_keys=True, default=str)
+    return f"node:{name}:{hashlib.sha256(blob.encode()).hexdigest()}"
+
+def _read(state, read):
+    key, _, field = read.partition(".")
+    value = state.get(key)
+    if field:
+        value = [_field(v, field) for v in value] if isinstance(value, list) else _field(value, field)
+    if read.endswith("file_path"):
+        value = [_content(p) for p in value] if isinstance(value, list) else _content(value)
+    return value
+
+def _field(item, field):
+    return item.get(field) if isinstance(item, dict) else None
+
+def _content(path):
+    try:
+        return file_sha256(path) if path else None
+    except OSError:
+        return path
+
+def _plain(value):
+    # EXIF dicts can mix key types, which sort_keys can't order
+    if isinstance(value, dict):
+        return {str(k): _plain(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_plain(v) for v in value]
+    return value
+
+
+def reuse_outputs(name, reads):
+    """Skip the wrapped node (sync or async) when the inputs in `reads` are unchanged."""
+    def decorator(func):
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(state):
+                if state.get("use_llm_cache") is False:
+                    return await func(state)
+                key = await asyncio.to_thread(fingerprint, name, reads, state)
+                hit, update = await asyncio.to_thread(node_cache.get, key)
+                record_cache("node_outputs", hit)
+                if hit:
+                    return update
+                update = await func(state)
+                if update and not update.get("degraded"):
+                    await asyncio.to_thread(node_cache.set, key, update, NODE_CACHE_TTL)
+                return update
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(state):
+            if state.get("use_llm_cache") is False:
+                return func(state)
+            key = fingerprint(name, reads, state)
+            hit, update = node_cache.get(key)
+            record_cache("node_outputs", hit)
+            if hit:
+                return update
+            update = func(state)
+            if update and not update.get("degraded"):
+                node_cache.set(key, update, NODE_CACHE_TTL)
+            return update
+        return wrapper
+    return decorator
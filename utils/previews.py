@@ -0,0 +1,42 @@
+import io
+import os
+import hashlib
+
+import streamlit as st
+from PIL import Image, ImageOps
+
+from utils.exif_reader import read_exif_summary
+
+# Upload previews for the Streamlit apps.
+#
+# Streamlit re-runs the whole script on every widget change. Without caching,
+# each rerun decoded the full-size upload, parsed its EXIF again and sent the
+# original (often several MB) back to the browser. Here both are computed once
+# per upload, keyed by the SHA-256 of its bytes, and the browser gets a small
+# JPEG. The caches are shared between sessions (the key is the content) and
+# hold at most MAX_ENTRIES uploads each.
+
+PREVIEW_SIDE = 800
+MAX_ENTRIES = int(os.getenv("CLAIM_UI_CACHE_ENTRIES", 32))
+
+
+def upload_digest(data):
+    return hashlib.sha256(data).hexdigest()
+
+# The bytes are passed as `_data` so Streamlit keys the cache on the digest
+# alone instead of hashing the whole upload again on every rerun
+@st.cache_data(max_entries=MAX_ENTRIES, show_spinner=False)
+def preview_jpeg(digest, _data, max_side=PREVIEW_SIDE):
+    """An upright JPEG of the upload no larger than max_side on either side."""
+    with Image.open(io.BytesIO(_data)) as img:
+        img.draft("RGB", (max_side, max_side))  # JPEGs decode at a reduced scale
+        img = ImageOps.exif_transpose(img)
+        img.thumbnail((max_side, max_side))
+        out = io.BytesIO()
+        img.convert("RGB").save(out, "JPEG", quality=85)
+    return out.getvalue()
+
+@st.cache_data(max_entries=MAX_ENTRIES, show_spinner=False)
+def upload_exif(digest, _data):
+    """read_exif_summary of the upload, parsed once per upload."""
+    return read_exif_summary(io.BytesIO(_data))
@@ -0,0 +1,299 @@
+import os
+import time
+import random
+import asyncio
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from utils.clients import register, get_client
+from utils.tracing import metrics
+
+# Shared wrapper for every remote call (Vision, Gemini, OpenAI).
+#
+#   resilient_call("gemini", lambda: model.generate_content(prompt))
+#   await aresilient_call("gemini", lambda: model.generate_content_async(prompt))
+#
+# Per backend, each call:
+#   1. fails fast with BackendUnavailable while the circuit breaker is open;
+#   2. waits for a token from a client-side token bucket, so a burst of claims
+#      is smoothed out instead of tripping the provider's rate limit;
+#   3. runs under a deadline; a sync call runs on a pool thread so a hung
+#      socket cannot block the caller past it;
+#   4. optionally sends a hedged duplicate if the first attempt is still
+#      running after `hedge_after` seconds, taking whichever finishes first;
+#   5. retries retryable failures (timeouts, 429, 5xx) with full-jitter
+#      exponential backoff.
+# When retries run out the breaker records a failure and BackendUnavailable is
+# raised; claim_agent turns that into a FLAG decision rather than a crash.
+
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+RETRYABLE_ERRORS = {
+    # google.api_core.exceptions
+    "ResourceExhausted", "TooManyRequests", "ServiceUnavailable", "DeadlineExceeded",
+    "InternalServerError", "BadGateway", "GatewayTimeout", "RetryError",
+    # openai
+    "RateLimitError", "APITimeoutError", "APIConnectionError",
+    # httpx / requests / grpc transport errors
+    "ConnectError", "ReadTimeout", "ConnectTimeout", "RemoteProtocolError",
+}
+
+
+class BackendUnavailable(Exception):
+    def __init__(self, backend, reason):
+        super().__init__(f"{backend} unavailable: {reason}")
+        self.backend = backend
+        self.reason = reason
+
+
+class Policy:
+    def __init__(self, timeout, retries=3, backoff=0.5, max_backoff=8.0, hedge_after=None,
+                 rate=5.0, burst=10, failure_threshold=5, cooldown=30.0):
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.hedge_after = hedge_after
+        self.rate = rate
+        self.burst = burst
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+
+DEFAULT_POLICIES = {
+    "vision": dict(timeout=20.0, rate=10.0, burst=20),
+    "gemini": dict(timeout=60.0, rate=5.0, burst=10),
+    "openai": dict(timeout=45.0, rate=5.0, burst=10),
+}
+
+def policy_for(backend):
+    """Defaults above, overridable with CLAIM_<BACKEND>_<SETTING> env vars."""
+    settings = dict(DEFAULT_POLICIES.get(backend, {"timeout": 30.0}))
+    prefix = f"CLAIM_{backend.upper()}_"
+    for name in ("timeout", "retries", "backoff", "max_backoff", "hedge_after",
+                 "rate", "burst", "failure_threshold", "cooldown"):
+        value = os.getenv(prefix + name.upper())
+        if value:
+            settings[name] = float(value) if name not in ("retries", "burst", "failure_threshold") else int(value)
+    return Policy(**settings)
+
+
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _take(self):
+        """Take a token and return 0, or return how long to wait for one."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+    def acquire(self):
+        while (delay := self._take()) > 0:
+            time.sleep(delay)
+
+    async def aacquire(self):
+        while (delay := self._take()) > 0:
+            await asyncio.sleep(delay)
+
+
+class CircuitBreaker:
+    """Opens after `threshold` consecutive failures; one trial call after `cooldown`."""
+
+    def __init__(self, threshold, cooldown):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at >= self.cooldown and not self._trial:
+                self._trial = True  # half-open: let one call through
+                return True
+            return False
+
+    def success(self):
+        with self._lock:
+            self.failures, self.opened_at, self._trial = 0, None, False
+
+    def failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial or self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+            self._trial = False
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        return "half-open" if self._trial else "open"
+
+
+class _Backend:
+    def __init__(self, name):
+        self.name = name
+        self.policy = policy_for(name)
+        self.bucket = TokenBucket(self.policy.rate, self.policy.burst)
+        self.breaker = CircuitBreaker(self.policy.failure_threshold, self.policy.cooldown)
+
+# Per-backend state and the deadline pool live in the client registry, so a
+# forked worker starts with fresh locks and threads
+def _backend(name):
+    key = f"resilience:{name}"
+    try:
+        return get_client(key)
+    except KeyError:
+        register(key, lambda: _Backend(name))
+        return get_client(key)
+
+register("resilience_pool", lambda: ThreadPoolExecutor(
+    max_workers=int(os.getenv("CLAIM_CALL_THREADS", 64)), thread_name_prefix="remote-call",
+))
+
+
+def is_retryable(error):
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    status = getattr(error, "status_code", None) or getattr(error, "code", None)
+    if isinstance(status, int) and status in RETRYABLE_STATUS:
+        return True
+    return any(cls.__name__ in RETRYABLE_ERRORS for cls in type(error).__mro__)
+
+def _backoff(policy, attempt):
+    return random.uniform(0, min(policy.max_backoff, policy.backoff * 2 ** attempt))
+
+
+def resilient_call(backend, fn):
+    """Call fn() with backend's deadline, rate limit, hedging, retries and breaker."""
+    state = _backend(backend)
+    policy = state.policy
+    for attempt in range(policy.retries + 1):
+        if not state.breaker.allow():
+            metrics.inc("claim_backend_rejected_total", {"backend": backend})
+            raise BackendUnavailable(backend, "circuit open")
+        try:
+            result = _attempt(state, fn)
+        except Exception as e:
+            if not is_retryable(e):
+                state.breaker.success()  # the service answered; the request was bad
+                raise
+            state.breaker.failure()
+            if attempt == policy.retries:
+                raise BackendUnavailable(backend, repr(e)) from e
+            metrics.inc("claim_backend_retries_total", {"backend": backend})
+            time.sleep(_backoff(policy, attempt))
+            continue
+        state.breaker.success()
+        return result
+
+def _attempt(state, fn):
+    pool = get_client("resilience_pool")
+    policy = state.policy
+
+    def submit():
+        state.bucket.acquire()
+        # Copy the context so tracing spans still see calls made on pool threads
+        return pool.submit(contextvars.copy_context().run, fn)
+
+    pending = {submit()}
+    deadline = time.monotonic() + policy.timeout  # time spent rate-limited doesn't count
+    if policy.hedge_after is not None:
+        done, _ = wait(pending, timeout=policy.hedge_after)
+        if not done:
+            metrics.inc("claim_backend_hedges_total", {"backend": state.name})
+            pending.add(submit())
+
+    error = None
+    while pending:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                for other in pending:
+                    other.cancel()
+                return future.result()
+            error = future.exception()
+    if error is not None and not pending:
+        raise error
+    for future in pending:
+        future.cancel()  # a running call cannot be interrupted; its result is dropped
+    raise TimeoutError(f"{state.name} call exceeded {policy.timeout:g}s deadline")
+
+
+async def aresilient_call(backend, afn):
+    """Async counterpart of resilient_call; afn() returns an awaitable."""
+    state = _backend(backend)
+    policy = state.policy
+    for attempt in range(policy.retries + 1):
+        if not state.breaker.allow():
+            metrics.inc("claim_backend_rejected_total", {"backend": backend})
+            raise BackendUnavailable(backend, "circuit open")
+        try:
+            result = await _aattempt(state, afn)
+        except Exception as e:
+            if not is_retryable(e):
+                state.breaker.success()
+                raise
+            state.breaker.failure()
+            if attempt == policy.retries:
+                raise BackendUnavailable(backend, repr(e)) from e
+            metrics.inc("claim_backend_retries_total", {"backend": backend})
+            await asyncio.sleep(_backoff(policy, attempt))
+            continue
+        state.breaker.success()
+        return result
+
+async def _aattempt(state, afn):
+    policy = state.policy
+
+    async def one():
+        await state.bucket.aacquire()
+        return await afn()
+
+    async def hedged():
+        first = asyncio.ensure_future(one())
+        tasks = {first}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=policy.hedge_after)
+            if not done:
+                metrics.inc("claim_backend_hedges_total", {"backend": state.name})
+                tasks.add(asyncio.ensure_future(one()))
+            error = None
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    try:
+        if policy.hedge_after is None:
+            return await asyncio.wait_for(one(), policy.timeout)
+        return await asyncio.wait_for(hedged(), policy.timeout)
+    except asyncio.TimeoutError:
+        raise TimeoutError(f"{state.name} call exceeded {policy.timeout:g}s deadline") from None
+
+
+def breaker_states():
+    """{backend: "closed" | "open" | "half-open"} for the backends used so far."""
+    return {name: _backend(name).breaker.state for name in DEFAULT_POLICIES}
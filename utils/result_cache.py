@@ -0,0 +1,192 @@
+import os
+import time
+import pickle
+import sqlite3
+import hashlib
+import asyncio
+import functools
+import threading
+
+from utils.tracing import record_cache
+
+CACHE_DIR = os.getenv("CLAIM_CACHE_DIR", "data/cache")
+
+
+# Content hashing
+_hash_memo = {}
+_hash_lock = threading.Lock()
+
+def file_sha256(path: str) -> str:
+    """SHA-256 of a file's bytes, memoized on (path, size, mtime)."""
+    st = os.stat(path)
+    memo_key = (os.path.abspath(path), st.st_size, st.st_mtime_ns)
+    with _hash_lock:
+        digest = _hash_memo.get(memo_key)
+    if digest:
+        return digest
+
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    digest = h.hexdigest()
+    with _hash_lock:
+        _hash_memo[memo_key] = digest
+    return digest
+
+
+class DiskCache:
+    """Persistent key/value cache in a single SQLite file.
+
+    Entries carry an optional TTL and are evicted least-recently-used first
+    once the stored values exceed `max_bytes`. Values are pickled, so any
+    picklable result (lists, dicts, EXIF values) can be stored.
+    """
+
+    def __init__(self, path, max_bytes=256 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._conn = None
+        self._lock = threading.Lock()
+
+    # The database is opened on first use so importing a module that owns a
+    # cache never touches the filesystem.
+    def _db(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS entries (
+                    key TEXT PRIMARY KEY,
+                    value BLOB NOT NULL,
+                    size INTEGER NOT NULL,
+                    expires_at REAL,
+                    last_access REAL NOT NULL
+                )"""
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS entries_lru ON entries(last_access)")
+            self._conn = conn
+        return self._conn
+
+    def get(self, key):
+        """Return (hit, value). Expired entries count as misses and are dropped."""
+        now = time.time()
+        with self._lock:
+            db = self._db()
+            row = db.execute(
+                "SELECT value, expires_at FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or (row[1] is not None and row[1] <= now):
+                if row is not None:
+                    db.execute("DELETE FROM entries WHERE key = ?", (key,))
+                    db.commit()
+                self.misses += 1
+                return False, None
+            db.execute("UPDATE entries SET last_access = ? WHERE key = ?", (now, key))
+            db.commit()
+            self.hits += 1
+        return True, pickle.loads(row[0])
+
+    def set(self, key, value, ttl=None):
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        now = time.time()
+        expires_at = now + ttl if ttl else None
+        with self._lock:
+            db = self._db()
+            db.execute(
+                "INSERT OR REPLACE INTO entries (key, value, size, expires_at, last_access)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (key, blob, len(blob), expires_at, now),
+            )
+            self._evict(db, now)
+            db.commit()
+
+    def _evict(self, db, now):
+        db.execute("DELETE FROM entries WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,))
+        total = db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in db.execute(
+            "SELECT key, size FROM entries ORDER BY last_access"
+        ).fetchall():
+            db.execute("DELETE FROM entries WHERE key = ?", (key,))
+            self.evictions += 1
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def clear(self):
+        with self._lock:
+            db = self._db()
+            db.execute("DELETE FROM entries")
+            db.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries, size = self._db().execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries"
+            ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": entries,
+            "bytes": size,
+        }
+
+
+image_cache = DiskCache(
+    os.path.join(CACHE_DIR, "image_results.sqlite"),
+    max_bytes=int(os.getenv("CLAIM_IMAGE_CACHE_MAX_BYTES", 256 * 1024 * 1024)),
+)
+
+
+def cached_by_image(namespace, ttl=None):
+    """Cache a function of an image path on the SHA-256 of the image bytes.
+
+    Byte-identical uploads share one entry no matter what they are named.
+    Bump the version suffix in `namespace` whenever the wrapped function's
+    output changes shape. Exceptions are never cached.
+    """
+    def decorator(func):
+        def cache_key(image_path):
+            try:
+                return f"{namespace}:{file_sha256(image_path)}"
+            except OSError:
+                return None
+
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(image_path, *args, **kwargs):
+                key = await asyncio.to_thread(cache_key, image_path)
+                if key:
+                    hit, value = await asyncio.to_thread(image_cache.get, key)
+                    record_cache(namespace, hit)
+                    if hit:
+                        return value
+                value = await func(image_path, *args, **kwargs)
+                if key:
+                    await asyncio.to_thread(image_cache.set, key, value, ttl)
+                return value
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(image_path, *args, **kwargs):
+            key = cache_key(image_path)
+            if key:
+                hit, value = image_cache.get(key)
+                record_cache(namespace, hit)
+                if hit:
+                    return value
+            value = func(image_path, *args, **kwargs)
+            if key:
+                image_cache.set(key, value, ttl)
+            return value
+        return wrapper
+    return decorator
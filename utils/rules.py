@@ -0,0 +1,78 @@
+from datetime import datetime
+
+# Deterministic claim rules, evaluated before any paid call.
+#
+# Each rule looks at the claim state and returns a reason string when it fires,
+# or None. A rule only fires on data that is already in the state, so the same
+# rules can be run on a partial state (e.g. EXIF only) without false hits.
+# REJECT rules mirror the "sure-shot" reject conditions in the final decision
+# prompt; a claim that hits any rule is decided here and never reaches the
+# summary, key-info or decision LLM calls.
+
+
+def missing_exif(state):
+    # Screenshots and stock images often keep a small EXIF block (UserComment,
+    # image size) but never a capture date; exif_date is None for those
+    if "exif_date" in state and state["exif_date"] is None:
+        return "EXIF capture date is missing (possible screenshot, downloaded or edited image)."
+
+def photo_before_policy(state):
+    # By calendar day: a policy starting on the day the photo was taken did
+    # not cover it yet (exif_vs_policy compares against midnight instead)
+    photo = _to_date(state.get("exif_date"))
+    policy = _to_date(state.get("policy_data", {}).get("policy_date"))
+    if photo and policy and policy >= photo:
+        return f"Policy start date ({policy}) is on or after the date the photo was taken ({photo})."
+
+def loss_before_policy(state):
+    policy_data = state.get("policy_data", {})
+    policy, dol = _to_date(policy_data.get("policy_date")), _to_date(policy_data.get("dol"))
+    if policy and dol and policy >= dol:
+        return f"Policy start date ({policy}) is on or after the date of loss ({dol})."
+
+def duplicate_image(state):
+    matches = state.get("duplicate_of")
+    if matches:
+        claims = ", ".join(dict.fromkeys(m["claim_id"] for m in matches))
+        return f"Image matches {len(matches)} previously submitted image(s) ({claims}); sent for fraud review."
+
+
+# Order matters: the first hit decides, the rest are listed as extra reasons
+HARD_RULES = [
+    ("REJECT", missing_exif),
+    ("REJECT", photo_before_policy),
+    ("REJECT", loss_before_policy),
+    ("FLAG", duplicate_image),
+]
+
+
+def evaluate_rules(state):
+    """Run HARD_RULES on a claim state.
+
+    Returns {"rule_hits": [...]}, plus "final_decision" when a rule fired.
+    """
+    hits = []
+    for verdict, rule in HARD_RULES:
+        reason = rule(state)
+        if reason:
+            hits.append({"rule": rule.__name__, "verdict": verdict, "reason": reason})
+    if not hits:
+        return {"rule_hits": []}
+
+    lines = [f"{hits[0]['verdict']}: {hits[0]['reason']}"]
+    lines += [f"- {hit['verdict']} ({hit['rule']}): {hit['reason']}" for hit in hits[1:]]
+    lines.append("- Decided by deterministic rules; image analysis and LLM review were skipped.")
+    return {"rule_hits": hits, "final_decision": "\n".join(lines)}
+
+
+def _to_date(value):
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    if hasattr(value, "isoformat"):
+        return value  # already a date
+    try:
+        return datetime.fromisoformat(str(value).split("T")[0]).date()
+    except ValueError:
+        return None
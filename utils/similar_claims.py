@@ -1,9 +1,311 @@
-# Placeholder version — replace with vector DB retrieval later
-def retrieve_similar_claims(summary_text):
-    # In a real implementation, this would use FAISS/Chroma and sentence embeddings
-    return (
-        "Found 2 similar past claims:\n"
-        "- Case #1032: Tree damage on roof, ₹45,000 payout\n"
-        "- Case #1168: Storm impact, ₹52,000 settled\n"
-        "(Matched based on semantic similarity to claim summary)"
-    )
+import os
+import re
+import json
+import time
+import zlib
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+
+from utils.clients import register, get_client
+
+# Local similarity search over past claims.
+#
+# Claims are embedded locally (hashed word uni/bigrams, no model download) and
+# stored in a float32 file that is memory-mapped on open, so startup cost does
+# not grow with history and adding a claim never rebuilds anything. Metadata
+# lives next to it in SQLite, keyed by row number. A claim ID has one row: a
+# re-evaluated claim overwrites its vector in place, and lookups for a claim
+# leave its own row out.
+#
+# Below IVF_MIN_ROWS every query scans all vectors in chunks. Past that, an
+# IVF index is trained once (k-means centroids); each new row is assigned to
+# its nearest centroid on append, the row numbers of every centroid's list are
+# kept in memory, and queries only score the NPROBE closest lists, which keeps
+# per-claim lookups sublinear at hundreds of thousands of claims.
+
+INDEX_DIR = os.getenv("CLAIM_INDEX_DIR", "data/claim_index")
+DIM = 512
+IVF_MIN_ROWS = int(os.getenv("CLAIM_INDEX_IVF_MIN_ROWS", 20000))
+NPROBE = int(os.getenv("CLAIM_INDEX_NPROBE", 8))
+SCAN_CHUNK = 65536
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def embed_texts(texts) -> np.ndarray:
+    """L2-normalized hashed bag of uni- and bigrams, one row per text."""
+    out = np.zeros((len(texts), DIM), dtype=np.float32)
+    for row, text in enumerate(texts):
+        tokens = _TOKEN.findall((text or "").lower())
+        grams = tokens + [a + " " + b for a, b in zip(tokens, tokens[1:])]
+        for gram in grams:
+            h = zlib.crc32(gram.encode("utf-8"))
+            out[row, h % DIM] += 1.0 if h & 0x80000000 else -1.0
+    out = np.sign(out) * np.log1p(np.abs(out))  # damp repeated words
+    norms = np.linalg.norm(out, axis=1, keepdims=True)
+    return out / np.maximum(norms, 1e-12)
+
+
+class ClaimIndex:
+    def __init__(self, path=INDEX_DIR):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self._vectors_path = os.path.join(path, "vectors.f32")
+        self._assign_path = os.path.join(path, "assign.i32")
+        self._centroids_path = os.path.join(path, "centroids.npy")
+        self._lock = threading.RLock()
+        self._db = sqlite3.connect(os.path.join(path, "meta.sqlite"), check_same_thread=False)
+        self._db.execute("CREATE TABLE IF NOT EXISTS claims (id INTEGER PRIMARY KEY, meta TEXT, claim_id TEXT)")
+        # Indexes created before rows were keyed by claim ID
+        if "claim_id" not in {row[1] for row in self._db.execute("PRAGMA table_info(claims)")}:
+            self._db.execute("ALTER TABLE claims ADD COLUMN claim_id TEXT")
+            self._db.execute("UPDATE claims SET claim_id = json_extract(meta, '$.claim_id')")
+        self._db.execute("CREATE INDEX IF NOT EXISTS claims_claim_id ON claims(claim_id)")
+        self._db.commit()
+        self._centroids = (
+            np.load(self._centroids_path) if os.path.exists(self._centroids_path) else None
+        )
+        self._vectors = None
+        self._assign = None
+        self._lists = None  # row numbers per centroid, once the IVF index is trained
+        self._mapped_rows = -1
+
+    def __len__(self):
+        if not os.path.exists(self._vectors_path):
+            return 0
+        return os.path.getsize(self._vectors_path) // (DIM * 4)
+
+    # Re-map only when another writer (or this one) appended rows. Runs under
+    # the lock so it never reads assign.i32 while _train_ivf replaces it.
+    def _maps(self):
+        with self._lock:
+            if self._centroids is None and os.path.exists(self._centroids_path):
+                self._centroids = np.load(self._centroids_path)  # trained by another process
+            rows = len(self)
+            if self._centroids is not None:
+                # A concurrent append writes vectors before assignments
+                rows = min(rows, os.path.getsize(self._assign_path) // 4)
+            if rows != self._mapped_rows:
+                previous = self._mapped_rows
+                self._vectors = (
+                    np.memmap(self._vectors_path, dtype=np.float32, mode="r", shape=(rows, DIM))
+                    if rows else np.zeros((0, DIM), dtype=np.float32)
+                )
+                self._assign = (
+                    np.memmap(self._assign_path, dtype=np.int32, mode="r", shape=(rows,))
+                    if self._centroids is not None and rows else None
+                )
+                self._index_lists(previous, rows)
+                self._mapped_rows = rows
+            return self._vectors, self._lists
+
+    def _index_lists(self, previous, rows):
+        if self._assign is None:
+            self._lists = None
+        elif self._lists is None or not 0 <= previous <= rows:
+            order = np.argsort(self._assign, kind="stable")
+            bounds = np.searchsorted(self._assign[order], np.arange(len(self._centroids) + 1))
+            self._lists = [order[a:b] for a, b in zip(bounds[:-1], bounds[1:])]
+        else:
+            # Only the appended rows are sorted into their lists
+            new_rows = np.arange(previous, rows)
+            assigned = np.asarray(self._assign[previous:rows])
+            for c in np.unique(assigned):
+                self._lists[c] = np.concatenate([self._lists[c], new_rows[assigned == c]])
+
+    def add(self, texts, metas):
+        """Index claims; each meta dict is returned with search hits.
+
+        A claim ID that is already indexed keeps its row, with the new text
+        and meta.
+        """
+        vectors = embed_texts(texts)
+        with self._lock, _exclusive(os.path.join(self.path, ".lock")):
+            self._maps()
+            start = next_row = len(self)
+            rows, placed = [], {}
+            for meta in metas:
+                claim_id = meta.get("claim_id")
+                row = placed.get(claim_id)
+                if row is None:
+                    existing = self._rows_of(claim_id)
+                    row = max(existing) if existing else next_row
+                    next_row += row == next_row
+                    if claim_id is not None:
+                        placed[claim_id] = row
+                rows.append(row)
+            self._db.executemany(
+                "INSERT OR REPLACE INTO claims (id, meta, claim_id) VALUES (?, ?, ?)",
+                [(row, json.dumps(meta, default=str), meta.get("claim_id")) for row, meta in zip(rows, metas)],
+            )
+            self._db.commit()
+
+            # The last text given for a row wins
+            latest = {row: i for i, row in enumerate(rows)}
+            appended = [latest[row] for row in range(start, next_row)]
+            overwritten = [(row, i) for row, i in latest.items() if row < start]
+            with open(self._vectors_path, "ab") as f:
+                f.write(vectors[appended].tobytes())
+            if overwritten:
+                with open(self._vectors_path, "r+b") as f:
+                    for row, i in overwritten:
+                        f.seek(row * DIM * 4)
+                        f.write(vectors[i].tobytes())
+            if self._centroids is not None:
+                assigned = self._nearest_centroid(vectors).astype(np.int32)
+                with open(self._assign_path, "ab") as f:
+                    f.write(assigned[appended].tobytes())
+                if overwritten:
+                    with open(self._assign_path, "r+b") as f:
+                        for row, i in overwritten:
+                            self._reassign(row, int(assigned[i]))
+                            f.seek(row * 4)
+                            f.write(assigned[i].tobytes())
+            elif next_row >= IVF_MIN_ROWS:
+                self._train_ivf()
+
+    def _reassign(self, row, centroid):
+        # Moves an overwritten row to its new list before the file changes
+        if self._lists is None or row >= self._mapped_rows:
+            return
+        old = int(self._assign[row])
+        if old != centroid:
+            self._lists[old] = self._lists[old][self._lists[old] != row]
+            self._lists[centroid] = np.append(self._lists[centroid], row)
+
+    def _rows_of(self, claim_id):
+        if claim_id is None:
+            return set()
+        return {row for (row,) in self._db.execute("SELECT id FROM claims WHERE claim_id = ?", (claim_id,))}
+
+    def search(self, queries, k=3, exclude_claim_id=None):
+        """Top-k (score, meta) lists for a batch of query texts, best first.
+
+        Rows of `exclude_claim_id` (the claim being evaluated) are left out.
+        """
+        vectors, lists = self._maps()
+        if not len(vectors) or not queries:
+            return [[] for _ in queries]
+        q = embed_texts(queries)
+        skip = self._rows_of(exclude_claim_id)
+        fetch = k + len(skip)
+
+        results = []
+        if lists is not None:
+            probes = np.argsort(-(q @ self._centroids.T), axis=1)[:, :NPROBE]
+            for qi in range(len(q)):
+                rows = np.concatenate([lists[c] for c in probes[qi]])
+                rows = rows[rows < len(vectors)]
+                scores = vectors[rows] @ q[qi]
+                results.append(_top_k(rows, scores, fetch))
+        else:
+            best = [(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32))] * len(q)
+            for start in range(0, len(vectors), SCAN_CHUNK):
+                block = np.asarray(vectors[start:start + SCAN_CHUNK])
+                scores = q @ block.T
+                rows = np.arange(start, start + len(block))
+                best = [
+                    _merge(best[qi], rows, scores[qi], fetch) for qi in range(len(q))
+                ]
+            results = [_top_k(r, s, fetch) for r, s in best]
+
+        return [self._with_meta([(r, s) for r, s in hits if r not in skip][:k]) for hits in results]
+
+    def _with_meta(self, hits):
+        if not hits:
+            return []
+        ids = [row for row, _ in hits]
+        found = dict(self._db.execute(
+            f"SELECT id, meta FROM claims WHERE id IN ({','.join('?' * len(ids))})", ids
+        ).fetchall())
+        return [(score, json.loads(found[row])) for row, score in hits if row in found]
+
+    def _nearest_centroid(self, vectors):
+        return np.argmax(vectors @ self._centroids.T, axis=1)
+
+    def _train_ivf(self, iterations=10, sample=50000):
+        vectors, _ = self._maps()
+        nlist = int(min(4096, max(16, 4 * np.sqrt(len(vectors)))))
+        rng = np.random.default_rng(0)
+        train = np.asarray(vectors[rng.choice(len(vectors), min(sample, len(vectors)), replace=False)])
+
+        # Spherical k-means: vectors are unit length, so cosine is a dot product
+        centroids = train[rng.choice(len(train), nlist, replace=False)].copy()
+        for _ in range(iterations):
+            labels = np.argmax(train @ centroids.T, axis=1)
+            for c in range(nlist):
+                members = train[labels == c]
+                if len(members):
+                    centroid = members.sum(axis=0)
+                    centroids[c] = centroid / max(np.linalg.norm(centroid), 1e-12)
+        self._centroids = centroids.astype(np.float32)
+
+        # Written aside and renamed, so other processes never map a partial file
+        with open(self._assign_path + ".tmp", "wb") as f:
+            for start in range(0, len(vectors), SCAN_CHUNK):
+                block = np.asarray(vectors[start:start + SCAN_CHUNK])
+                f.write(self._nearest_centroid(block).astype(np.int32).tobytes())
+        os.replace(self._assign_path + ".tmp", self._assign_path)
+        with open(self._centroids_path + ".tmp", "wb") as f:
+            np.save(f, self._centroids)
+        os.replace(self._centroids_path + ".tmp", self._centroids_path)
+        self._lists = None
+        self._mapped_rows = -1
+
+
+@contextmanager
+def _exclusive(lock_path):
+    # Row numbers come from the file length, so appends from several worker
+    # processes must not interleave
+    try:
+        import fcntl
+    except ImportError:  # Windows: single-process use only
+        yield
+        return
+    with open(lock_path, "w") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+def _top_k(rows, scores, k):
+    if len(scores) > k:
+        part = np.argpartition(-scores, k)[:k]
+        rows, scores = rows[part], scores[part]
+    order = np.argsort(-scores)
+    return list(zip(rows[order].tolist(), scores[order].tolist()))
+
+def _merge(best, rows, scores, k):
+    rows = np.concatenate([best[0], rows])
+    scores = np.concatenate([best[1], scores])
+    if len(scores) > k:
+        part = np.argpartition(-scores, k)[:k]
+        rows, scores = rows[part], scores[part]
+    return rows, scores
+
+
+register("claim_index", ClaimIndex)
+
+
+def claim_text(summary, key_info=""):
+    return f"{summary or ''}\n{key_info or ''}".strip()
+
+def retrieve_similar_claims(summary_text, key_info="", k=3, exclude_claim_id=None):
+    hits = get_client("claim_index").search(
+        [claim_text(summary_text, key_info)], k=k, exclude_claim_id=exclude_claim_id
+    )[0]
+    if not hits:
+        return "No similar past claims found."
+    lines = [f"Found {len(hits)} similar past claims:"]
+    for score, meta in hits:
+        snippet = " ".join(meta.get("summary", "").split())[:160]
+        lines.append(f"- {meta.get('claim_id', 'unknown')} (similarity {score:.2f}): {snippet}")
+    return "\n".join(lines)
+
+def record_claim(claim_id, summary_text, key_info="", **extra):
+    meta = {"claim_id": claim_id, "summary": summary_text, "indexed_at": time.time(), **extra}
+    get_client("claim_index").add([claim_text(summary_text, key_info)], [meta])
@@ -1,33 +1,49 @@
 import os
-from google.auth import load_credentials_from_file
-import google.generativeai as genai
-from google.generativeai.types import HarmCategory, HarmBlockThreshold
 
-# ✅ Point to your service account JSON
-SERVICE_ACCOUNT_KEY_PATH = "/Users/vamsikrishna/Documents/LEARNING PROJECTS/AI PROJECTS/ImageProcessing/new_key.json"
+from utils.clients import register, get_client
+from utils.llm_cache import cached_completion, acached_completion
+from utils.tracing import record_usage
+from utils.resilience import resilient_call, aresilient_call
 
-# ✅ Load credentials with correct scope
-credentials, _ = load_credentials_from_file(
-    SERVICE_ACCOUNT_KEY_PATH,
-    scopes=["https://www.googleapis.com/auth/cloud-platform"]
+# ✅ Point to your service account JSON (override with GOOGLE_SERVICE_ACCOUNT_KEY)
+SERVICE_ACCOUNT_KEY_PATH = os.getenv(
+    "GOOGLE_SERVICE_ACCOUNT_KEY",
+    "/Users/vamsikrishna/Documents/LEARNING PROJECTS/AI PROJECTS/ImageProcessing/new_key.json",
 )
 
-# ✅ Configure genai with credentials
-genai.configure(credentials=credentials)
-
-# ✅ Initialize Gemini model
-model = genai.GenerativeModel(
-    model_name="models/gemini-1.5-flash",
-    safety_settings={
-        HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE,
-        HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_NONE,
-        HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: HarmBlockThreshold.BLOCK_NONE,
-        HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_NONE,
-    }
-)
+MODEL_NAME = "models/gemini-1.5-flash"
+
+# ✅ Credentials and the Gemini model are created on first use, not at import
+def _make_model():
+    import google.generativeai as genai
+    from google.generativeai.types import HarmCategory, HarmBlockThreshold
+
+    # ✅ Load credentials with correct scope; without a key file genai falls
+    # back to GOOGLE_API_KEY or application default credentials
+    if os.path.exists(SERVICE_ACCOUNT_KEY_PATH):
+        from google.auth import load_credentials_from_file
+
+        credentials, _ = load_credentials_from_file(
+            SERVICE_ACCOUNT_KEY_PATH,
+            scopes=["https://www.googleapis.com/auth/cloud-platform"]
+        )
+        genai.configure(credentials=credentials)
+
+    # ✅ Initialize Gemini model
+    return genai.GenerativeModel(
+        model_name=MODEL_NAME,
+        safety_settings={
+            HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE,
+            HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_NONE,
+            HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: HarmBlockThreshold.BLOCK_NONE,
+            HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_NONE,
+        }
+    )
+
+register("gemini_summarizer", _make_model)
 
-def summarize_text(claim_text: str) -> str:
-    prompt = f"""
+def build_prompt(claim_text: str) -> str:
+    return f"""
 You are an expert insurance assistant.
 
 Analyze the following:
@@ -39,5 +55,25 @@ Return a summary in this format:
 - 📝 Summary: <summary of the user claim>
 - 🔍 Visual Label Relevance: <does the image content support or contradict the claim?>
 """
-    response = model.generate_content(prompt)
-    return response.text.strip()
+
+def summarize_text(claim_text: str, use_cache: bool = True) -> str:
+    prompt = build_prompt(claim_text)
+
+    def call():
+        model = get_client("gemini_summarizer")
+        response = resilient_call("gemini", lambda: model.generate_content(prompt))
+        record_usage(MODEL_NAME, response, prompt, response.text)
+        return response.text.strip()
+
+    return cached_completion(MODEL_NAME, {}, prompt, call, use_cache=use_cache)
+
+async def asummarize_text(claim_text: str, use_cache: bool = True) -> str:
+    prompt = build_prompt(claim_text)
+
+    async def call():
+        model = get_client("gemini_summarizer")
+        response = await aresilient_call("gemini", lambda: model.generate_content_async(prompt))
+        record_usage(MODEL_NAME, response, prompt, response.text)
+        return response.text.strip()
+
+    return await acached_completion(MODEL_NAME, {}, prompt, call, use_cache=use_cache)
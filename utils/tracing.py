@@ -0,0 +1,259 @@
+import os
+import json
+import time
+import asyncio
+import functools
+import threading
+import contextvars
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+# Per-claim tracing for the claim graph.
+#
+# Every graph node is wrapped with `traced(name, fn)`. While the node runs, a
+# span dict sits in a context variable; external calls (`external_call`), LLM
+# token counts (`record_tokens`) and cache lookups (`record_cache`) made
+# anywhere below the node add themselves to it. Worker threads started with
+# asyncio.to_thread inherit the context, so they report into the same span.
+# The finished span is returned in the node's update under "trace", which the
+# graph state concatenates, so the result of a run carries its own per-node
+# breakdown.
+#
+# The same measurements feed process-wide Prometheus histograms and counters.
+# `export_trace(result)` appends one JSON line per claim to TRACE_DIR and
+# refreshes this process's metrics file for a node_exporter textfile collector.
+
+TRACE_DIR = os.getenv("CLAIM_TRACE_DIR", "data/traces")
+
+# USD per million (prompt, completion) tokens
+MODEL_PRICES = {
+    "gemini-1.5-flash": (0.075, 0.30),
+    "gpt-3.5-turbo": (0.50, 1.50),
+}
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+_span = contextvars.ContextVar("claim_trace_span", default=None)
+
+
+# Node spans
+def traced(name, func):
+    """Wrap a graph node (sync or async) so its update carries a trace span."""
+    if asyncio.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(state):
+            span, token = _open_span(name)
+            try:
+                update = await func(state)
+            except Exception as e:
+                span["error"] = repr(e)
+                raise
+            finally:
+                _close_span(span, token)
+            return {**(update or {}), "trace": [span]}
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(state):
+        span, token = _open_span(name)
+        try:
+            update = func(state)
+        except Exception as e:
+            span["error"] = repr(e)
+            raise
+        finally:
+            _close_span(span, token)
+        return {**(update or {}), "trace": [span]}
+    return wrapper
+
+def _open_span(name):
+    span = {
+        "node": name,
+        "start": time.time(),
+        "ms": 0.0,
+        "calls": [],
+        "tokens": {"prompt": 0, "completion": 0},
+        "cost_usd": 0.0,
+        "cache": {"hits": 0, "misses": 0},
+    }
+    span["_t0"] = time.perf_counter()
+    return span, _span.set(span)
+
+def _close_span(span, token):
+    seconds = time.perf_counter() - span.pop("_t0")
+    span["ms"] = round(seconds * 1000, 1)
+    _span.reset(token)
+    metrics.observe("claim_node_duration_seconds", {"node": span["node"]}, seconds)
+
+
+# Recording from inside nodes
+@contextmanager
+def external_call(service, **labels):
+    """Time a call to an outside service (Vision, an LLM, Tesseract)."""
+    start = time.perf_counter()
+    outcome = "ok"
+    try:
+        yield
+    except BaseException:
+        outcome = "error"
+        raise
+    finally:
+        seconds = time.perf_counter() - start
+        metrics.observe(
+            "claim_external_call_duration_seconds",
+            {"service": service, "outcome": outcome}, seconds,
+        )
+        span = _span.get()
+        if span is not None:
+            span["calls"].append(
+                {"service": service, "ms": round(seconds * 1000, 1), "outcome": outcome, **labels}
+            )
+
+def record_tokens(model, prompt_tokens, completion_tokens, estimated=False):
+    model = model.split("/")[-1]
+    prompt_tokens, completion_tokens = int(prompt_tokens or 0), int(completion_tokens or 0)
+    price_in, price_out = MODEL_PRICES.get(model, (0.0, 0.0))
+    cost = (prompt_tokens * price_in + completion_tokens * price_out) / 1_000_000
+
+    metrics.inc("claim_llm_tokens_total", {"model": model, "kind": "prompt"}, prompt_tokens)
+    metrics.inc("claim_llm_tokens_total", {"model": model, "kind": "completion"}, completion_tokens)
+    metrics.inc("claim_llm_cost_usd_total", {"model": model}, cost)
+    span = _span.get()
+    if span is not None:
+        span["tokens"]["prompt"] += prompt_tokens
+        span["tokens"]["completion"] += completion_tokens
+        span["cost_usd"] += cost
+        if estimated:
+            span["tokens"]["estimated"] = True
+
+def record_usage(model, response, prompt="", completion=""):
+    """Record token usage from an SDK response, estimating it when absent."""
+    usage = _usage_of(response)
+    if usage:
+        record_tokens(model, *usage)
+    else:
+        # Roughly four characters per token for English text
+        record_tokens(model, len(prompt) // 4, len(completion) // 4, estimated=True)
+
+def _usage_of(response):
+    # LangChain chat models: AIMessage.usage_metadata
+    usage = getattr(response, "usage_metadata", None)
+    if isinstance(usage, dict) and "input_tokens" in usage:
+        return usage["input_tokens"], usage.get("output_tokens", 0)
+    # google.generativeai: GenerateContentResponse.usage_metadata
+    if usage is not None and hasattr(usage, "prompt_token_count"):
+        return usage.prompt_token_count, getattr(usage, "candidates_token_count", 0)
+    return None
+
+def record_cache(cache, hit):
+    metrics.inc("claim_cache_lookups_total", {"cache": cache, "result": "hit" if hit else "miss"})
+    span = _span.get()
+    if span is not None:
+        span["cache"]["hits" if hit else "misses"] += 1
+
+
+# Per-claim summaries
+def timings(state):
+    """{node: ms} for a finished run, in the order the nodes finished."""
+    return {span["node"]: span["ms"] for span in state.get("trace") or []}
+
+def trace_record(state):
+    spans = state.get("trace") or []
+    start = min((s["start"] for s in spans), default=time.time())
+    end = max((s["start"] + s["ms"] / 1000 for s in spans), default=start)
+    return {
+        "claim_id": state.get("claim_id"),
+        "file_path": state.get("file_path"),
+        "started_at": datetime.fromtimestamp(start, timezone.utc).isoformat(),
+        "wall_ms": round((end - start) * 1000, 1),
+        "decision": (state.get("final_decision") or "").split("\n", 1)[0][:200],
+        "tokens": {
+            "prompt": sum(s["tokens"]["prompt"] for s in spans),
+            "completion": sum(s["tokens"]["completion"] for s in spans),
+        },
+        "cost_usd": round(sum(s["cost_usd"] for s in spans), 6),
+        "cache": {
+            "hits": sum(s["cache"]["hits"] for s in spans),
+            "misses": sum(s["cache"]["misses"] for s in spans),
+        },
+        "nodes": spans,
+    }
+
+_export_lock = threading.Lock()
+
+def export_trace(state, trace_dir=None):
+    """Append this claim's trace to traces.jsonl and refresh the metrics file."""
+    trace_dir = trace_dir or TRACE_DIR
+    record = trace_record(state)
+    os.makedirs(trace_dir, exist_ok=True)
+    with _export_lock:
+        with open(os.path.join(trace_dir, "traces.jsonl"), "a") as f:
+            f.write(json.dumps(record, default=str) + "\n")
+    write_prometheus(os.path.join(trace_dir, f"metrics-{os.getpid()}.prom"))
+    return record
+
+
+# Prometheus exposition
+class Metrics:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self._histograms = {}  # (name, labels) -> [bucket counts, sum, count]
+        self._counters = {}    # (name, labels) -> value
+        self._lock = threading.Lock()
+
+    def observe(self, name, labels, value):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            h = self._histograms.setdefault(key, [[0] * len(self.buckets), 0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    h[0][i] += 1
+            h[1] += value
+            h[2] += 1
+
+    def inc(self, name, labels, value=1):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+    def text(self):
+        lines, typed = [], set()
+        with self._lock:
+            for (name, labels), (counts, total, count) in sorted(self._histograms.items()):
+                if name not in typed:
+                    lines.append(f"# TYPE {name} histogram")
+                    typed.add(name)
+                for bound, n in zip(self.buckets, counts):
+                    lines.append(f"{name}_bucket{_labels(labels + (('le', str(bound)),))} {n}")
+                lines.append(f"{name}_bucket{_labels(labels + (('le', '+Inf'),))} {count}")
+                lines.append(f"{name}_sum{_labels(labels)} {total}")
+                lines.append(f"{name}_count{_labels(labels)} {count}")
+            for (name, labels), value in sorted(self._counters.items()):
+                if name not in typed:
+                    lines.append(f"# TYPE {name} counter")
+                    typed.add(name)
+                lines.append(f"{name}{_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+def _labels(pairs):
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"') for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+metrics = Metrics()
+
+def prometheus_text():
+    return metrics.text()
+
+def write_prometheus(path):
+    # Write then rename so a scraper never reads a half-written file
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        f.write(metrics.text())
+    os.replace(tmp, path)
@@ -1,16 +1,216 @@
 # utils/vision_labels.py
 
-from google.cloud import vision
-from google.cloud.vision_v1.types.image_annotator import AnnotateImageResponse
+import os
+import asyncio
+import threading
+from concurrent.futures import Future, wait
+
+from utils.clients import register, get_client
+from utils.result_cache import file_sha256, image_cache
+from utils.tracing import external_call, record_cache
+from utils.resilience import resilient_call, aresilient_call
+
+# Labels for a given image never change, so a month is only a safety valve
+LABELS_TTL = 30 * 24 * 3600
+
+# Service limits for images:annotate. Requests are split on whichever is hit
+# first; the byte budget leaves headroom for base64 encoding.
+MAX_IMAGES_PER_REQUEST = 16
+MAX_REQUEST_BYTES = 8 * 1024 * 1024
+
+# google.cloud.vision is slow to import, so it is only loaded once a request is made
+def _vision():
+    from google.cloud import vision
+    return vision
+
+register("vision", lambda: _vision().ImageAnnotatorClient())
+register("vision_async", lambda: _vision().ImageAnnotatorAsyncClient(), per_loop=True)
+
 
 def get_image_labels(image_path: str) -> list:
-    client = vision.ImageAnnotatorClient()
+    result = annotate_images([image_path])[0]
+    if result["error"]:
+        raise RuntimeError(result["error"])
+    return result["labels"]
+
+async def aget_image_labels(image_path: str) -> list:
+    result = (await aannotate_images([image_path]))[0]
+    if result["error"]:
+        raise RuntimeError(result["error"])
+    return result["labels"]
+
+
+def annotate_images(image_paths, features=("LABEL_DETECTION",)) -> list:
+    """Annotate many images with as few batch_annotate_images calls as possible.
+
+    `features` are Vision feature names, e.g. ("LABEL_DETECTION",
+    "TEXT_DETECTION", "SAFE_SEARCH_DETECTION"); all of them are requested in
+    the same round trip. Returns one dict per input path, in input order,
+    with "labels", "text", "safe_search" and "error" keys. Results already
+    cached for byte-identical images are not sent again, and images another
+    call is sending right now are waited for instead of sent twice.
+    """
+    features = tuple(features)
+    results, waits, mine = [None] * len(image_paths), {}, []
+
+    client = get_client("vision")
+    try:
+        for chunk in _chunks(_misses(image_paths, features, results, waits, mine)):
+            requests = [_build_request(_read_bytes(item[2]), features) for item in chunk]
+            with external_call("vision", images=len(chunk)):
+                batch = resilient_call(
+                    "vision", lambda: client.batch_annotate_images(requests=requests)
+                )
+            _store_responses(chunk, batch.responses, results)
+    except BaseException as e:
+        _abandon(mine, e)
+        raise
+    _abandon(mine, RuntimeError("Vision returned no response for the image"))
+    retry = _collect(waits, results)
+    if retry:
+        for i, result in zip(retry, annotate_images([image_paths[i] for i in retry], features)):
+            results[i] = result
+    return results
+
+async def aannotate_images(image_paths, features=("LABEL_DETECTION",)) -> list:
+    """Async counterpart of annotate_images."""
+    features = tuple(features)
+    results, waits, mine = [None] * len(image_paths), {}, []
+
+    client = get_client("vision_async")
+    chunks = _chunks(_misses(image_paths, features, results, waits, mine))
+    try:
+        # Cache lookups and file reads happen a chunk at a time, off the loop
+        while chunk := await asyncio.to_thread(next, chunks, None):
+            contents = await asyncio.to_thread(lambda: [_read_bytes(item[2]) for item in chunk])
+            requests = [_build_request(content, features) for content in contents]
+            with external_call("vision", images=len(chunk)):
+                batch = await aresilient_call(
+                    "vision", lambda: client.batch_annotate_images(requests=requests)
+                )
+            await asyncio.to_thread(_store_responses, chunk, batch.responses, results)
+    except BaseException as e:
+        _abandon(mine, e)
+        raise
+    _abandon(mine, RuntimeError("Vision returned no response for the image"))
+    retry = await asyncio.to_thread(_collect, waits, results)
+    if retry:
+        for i, result in zip(retry, await aannotate_images([image_paths[i] for i in retry], features)):
+            results[i] = result
+    return results
+
+
+# Requests in flight, by cache key. A VISION_LABELS node asking for an image
+# the batch prefetch (or another claim) is already sending waits on that
+# request's future instead of paying for the image again.
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+def _misses(image_paths, features, results, waits, mine):
+    """Yield (i, key, path, future, size) for each image this call has to send.
+
+    Runs lazily, as _chunks fills each request: cached images go straight into
+    `results`, and images in flight elsewhere get their future in `waits`.
+    The futures this call owns are added to `mine`.
+    Only the sizes are read here; the bytes are read when a chunk is sent.
+    """
+    namespace = "vision:" + "+".join(sorted(features)) + ":v1"
+    for i, path in enumerate(image_paths):
+        key = f"{namespace}:{file_sha256(path)}"
+        hit, value = image_cache.get(key)
+        record_cache("vision", hit)
+        if hit:
+            results[i] = value
+            continue
+        with _inflight_lock:
+            future = _inflight.get(key)
+            if future is None:
+                _inflight[key] = future = Future()
+                mine.append((key, future))
+                owner = True
+            else:
+                owner = False
+        if owner:
+            yield i, key, path, future, os.path.getsize(path)
+        else:
+            waits[i] = future
+
+def _chunks(misses):
+    # A full chunk is sent before the next image is looked at
+    chunk, size = [], 0
+    for item in misses:
+        if chunk and size + item[-1] > MAX_REQUEST_BYTES:
+            yield chunk
+            chunk, size = [], 0
+        chunk.append(item)
+        size += item[-1]
+        if len(chunk) == MAX_IMAGES_PER_REQUEST:
+            yield chunk
+            chunk, size = [], 0
+    if chunk:
+        yield chunk
+
+def _settle(key, future, result=None, error=None):
+    with _inflight_lock:
+        if _inflight.get(key) is future:
+            del _inflight[key]
+    if error is None:
+        future.set_result(result)
+    else:
+        future.set_exception(error)
+
+def _collect(waits, results):
+    """Fill `results` from the requests waited on; returns the indexes whose request failed.
+
+    Those are sent again by the caller rather than failing with another
+    call's error.
+    """
+    wait(waits.values())
+    retry = []
+    for i, future in waits.items():
+        if future.exception() is None:
+            results[i] = future.result()
+        else:
+            retry.append(i)
+    return retry
+
+def _abandon(mine, error):
+    # Callers waiting on images this call didn't get an answer for see `error`
+    for key, future in mine:
+        if not future.done():
+            _settle(key, future, error=error)
+
+def _build_request(content, features):
+    vision = _vision()
+    return vision.AnnotateImageRequest(
+        image=vision.Image(content=content),
+        features=[vision.Feature(type_=vision.Feature.Type[name]) for name in features],
+    )
 
-    with open(image_path, "rb") as image_file:
-        content = image_file.read()
+def _store_responses(chunk, responses, results):
+    for (i, key, _, future, _), response in zip(chunk, responses):
+        result = _parse_response(response)
+        results[i] = result
+        if not result["error"]:
+            image_cache.set(key, result, LABELS_TTL)
+        _settle(key, future, result)
 
-    image = vision.Image(content=content)
-    response: AnnotateImageResponse = client.label_detection(image=image)
-    labels = response.label_annotations
+def _parse_response(response) -> dict:
+    vision = _vision()
+    safe_search = response.safe_search_annotation
+    return {
+        "labels": [label.description for label in response.label_annotations],
+        "text": (
+            response.full_text_annotation.text
+            or (response.text_annotations[0].description if response.text_annotations else "")
+        ),
+        "safe_search": {
+            field: vision.Likelihood(getattr(safe_search, field)).name
+            for field in ("adult", "spoof", "medical", "violence", "racy")
+        } if "safe_search_annotation" in response else {},
+        "error": response.error.message or None,
+    }
 
-    return [label.description for label in labels]
+def _read_bytes(path):
+    with open(path, "rb") as f:
+        return f.read()